@@ -148,6 +148,8 @@ class WorkingImage(QWidget):
     def __init__(self):
         super().__init__()
         self._image = QImage()
+        # shared memory frame displayed without copying, if any
+        self._frame = None
         self._createLabel()
         self._createViewAndScene()
 
@@ -207,8 +209,14 @@ class WorkingImage(QWidget):
         self.label.resizeEvent(a0)
         super(WorkingImage, self).resizeEvent(a0)
 
+    def _releaseFrame(self):
+        if self._frame is not None:
+            self._frame.release()
+            self._frame = None
+
     def clearView(self):
         self.image = QImage()
+        self._releaseFrame()
         if self.label.isHidden():
             self.view.hide()
             self.label.show()
@@ -245,6 +253,31 @@ class WorkingImage(QWidget):
             filepath = self.chooseImage()
         try:
             self.image = QImage(filepath)
+            self._releaseFrame()
+        except Exception as msg:
+            self.displayWarning(msg, 'Image failed to load!')
+
+    def loadFrame(self, frame):
+        '''
+        Displays B&W sharedframes.SharedFrame.
+
+        The displayed pixmap is a copy made once by QPixmap.fromImage,
+        but `_image` (used by invertColors, rotateImage etc.) wraps the
+        shared memory without copying. A reference to the frame is kept,
+        and `_image` must be replaced before the frame is released, so Qt
+        never reads an unmapped segment.
+        '''
+        try:
+            arr = frame.array()
+            ysize, xsize = arr.shape
+            img = QImage(
+                arr.data, xsize, ysize, arr.strides[0],
+                QImage.Format.Format_Grayscale8
+            )
+            previous, self._frame = self._frame, frame.acquire()
+            self.image = img
+            if previous is not None:
+                previous.release()
         except Exception as msg:
             self.displayWarning(msg, 'Image failed to load!')
 
@@ -293,7 +326,8 @@ class PlotsWidget(QWidget):
         self.canvas.hide()
 
     def drawPlots(self, img, xleft, xright, xstart, xend,
-                 wgLength, signal, losses, res, ycenter, yspan, yspanFull):
+                 wgLength, signal, losses, res, ycenter, yspan, yspanFull,
+                 xvals=None, signalErr=None):
         self.canvas._drawWaveguideCloseUp(
             img, xleft, xright, xstart, xend, ycenter, yspanFull
         )
@@ -301,7 +335,7 @@ class PlotsWidget(QWidget):
             img, wgLength, xleft, xright, xstart, xend, ycenter, yspan
         )
         self.canvas._drawSignalAndLosses(
-            signal, losses, res, xleft, xright, wgLength
+            signal, losses, res, xleft, xright, wgLength, xvals, signalErr
         )
 
         if self.canvas.isHidden():
@@ -374,10 +408,19 @@ class LossesPlot(FigureCanvasQTAgg):
         )
 
 
-    def _drawSignalAndLosses(self, signal, losses, res, xleft, xright, wgLength):
+    def _drawSignalAndLosses(self, signal, losses, res, xleft, xright, wgLength,
+                             xvals=None, signalErr=None):
         def lin(x): return res.slope * x + res.intercept
-        xvals = np.linspace(xleft*wgLength, xright*wgLength, signal.size)
-        self._ax3.scatter(xvals, signal, marker='.', c='r', ls='')
+        # positions are given for binned signal
+        if xvals is None:
+            xvals = np.linspace(xleft*wgLength, xright*wgLength, signal.size)
+        if signalErr is not None:
+            self._ax3.errorbar(
+                xvals, signal, yerr=signalErr, marker='.', c='r', ls='',
+                elinewidth=.5
+            )
+        else:
+            self._ax3.scatter(xvals, signal, marker='.', c='r', ls='')
         self._ax3.plot(xvals, lin(xvals), ls='--', c='k', lw=1.5)
         self._ax3.set_xlim((xleft * wgLength, xright * wgLength))
         self._ax3.text(
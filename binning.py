@@ -0,0 +1,113 @@
+'''
+Column binning of the signal and weighted linear fit of the bins.
+
+Very wide images give one signal point per pixel column. Averaging
+neighbouring columns into a fixed number of bins makes the fit,
+plotting and storing of the signal independent of the image width.
+
+Bins are fitted with weights equal to their number of points, which
+reproduces the full-resolution fit. Per-bin variances are not used as
+weights: neighbouring columns are correlated by the blur, so the
+sample variance within a bin underestimates the noise of its mean by
+a factor depending on the bin width, and the fit would change with the
+number of bins. They are kept for the error bars only.
+'''
+from collections import namedtuple
+
+import numpy as np
+from scipy.stats import t as studentT
+
+BinnedSignal = namedtuple('BinnedSignal', 'x signal variance counts')
+WeightedLinregressResult = namedtuple(
+    'WeightedLinregressResult',
+    'slope intercept rvalue pvalue stderr intercept_stderr'
+)
+
+
+def binSignal(x, signal, bins):
+    '''
+    Averages signal in (almost) equally wide bins of adjacent points.
+
+    Args:
+        x, signal: ndarray
+            Positions and values of signal points.
+        bins: int
+            Target number of bins. If signal has fewer points it is
+            returned as is (with zero variances).
+
+    Returns:
+        binned: BinnedSignal
+            Mean position, mean value, variance of the mean value (for
+            error bars) and number of points of every bin.
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    signal = np.asarray(signal, dtype=np.float64)
+    if bins < 1:
+        raise ValueError('Number of bins has to be positive.')
+    if signal.size <= bins:
+        return BinnedSignal(
+            x, signal, np.zeros_like(signal), np.ones(signal.size, int)
+        )
+
+    starts = np.linspace(0, signal.size, bins + 1).round().astype(int)[:-1]
+    counts = np.diff(np.append(starts, signal.size))
+    xMean = np.add.reduceat(x, starts) / counts
+    mean = np.add.reduceat(signal, starts) / counts
+    # two-pass variance, more accurate than E[y^2] - E[y]^2
+    deviations = signal - np.repeat(mean, counts)
+    sampleVariance = np.add.reduceat(deviations ** 2, starts) \
+        / np.maximum(counts - 1, 1)
+    return BinnedSignal(xMean, mean, sampleVariance / counts, counts)
+
+
+def weightedLinregress(x, y, weights=None):
+    '''
+    Weighted least squares fit of a line, counterpart of linregress.
+
+    Args:
+        x, y: ndarray
+            Fitted points.
+        weights: ndarray
+            Non-negative weights of the points, e.g. BinnedSignal.counts.
+            If None all points have the same weight.
+
+    Returns:
+        res: WeightedLinregressResult
+            Result with the same fields as scipy.stats.linregress.
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if weights is None:
+        weights = np.ones_like(y)
+    else:
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != y.shape or (weights < 0).any():
+            raise ValueError('Weights have to be non-negative, one per point.')
+
+    n = y.size
+    totalWeight = weights.sum()
+    xm = (weights * x).sum() / totalWeight
+    ym = (weights * y).sum() / totalWeight
+    dx, dy = x - xm, y - ym
+    sxx = (weights * dx * dx).sum()
+    sxy = (weights * dx * dy).sum()
+    syy = (weights * dy * dy).sum()
+
+    slope = sxy / sxx
+    intercept = ym - slope * xm
+    rvalue = sxy / np.sqrt(sxx * syy) if syy > 0 else 0.
+    rvalue = max(min(rvalue, 1.), -1.)
+    if n > 2:
+        residuals = y - (slope * x + intercept)
+        # single variance pooled from the residuals, weights only scale it
+        s2 = (weights * residuals ** 2).sum() / (n - 2)
+        stderr = np.sqrt(s2 / sxx)
+        interceptStderr = np.sqrt(s2 * (1 / totalWeight + xm ** 2 / sxx))
+        tvalue = slope / stderr if stderr > 0 else np.inf
+        pvalue = 2 * studentT.sf(abs(tvalue), n - 2)
+    else:
+        stderr = interceptStderr = 0.
+        pvalue = 1.
+    return WeightedLinregressResult(
+        slope, intercept, rvalue, pvalue, stderr, interceptStderr
+    )
@@ -0,0 +1,140 @@
+'''
+Dark-frame and flat-field correction of camera images.
+
+Master frames are built once from a set of captures and stored as
+float32 .npy files, which are later memory-mapped, so only the rows
+actually used in loss calculations are ever read from disk.
+'''
+import os
+
+import numpy as np
+from PIL import Image
+
+DARK_FILE = 'dark.npy'
+FLAT_FILE = 'flat.npy'
+
+
+def _averageFrames(filePaths):
+    total = None
+    for count, filePath in enumerate(filePaths, start=1):
+        with Image.open(filePath) as im:
+            frame = np.asarray(im.convert('L'), dtype=np.float64)
+        if total is None:
+            total = np.zeros_like(frame)
+        elif frame.shape != total.shape:
+            raise ValueError(f'{filePath} has different size than others.')
+        total += frame
+    if total is None:
+        raise ValueError('At least one frame is required.')
+    return total / count
+
+
+class Calibration:
+    '''
+    Master dark and flat frames applied as (img - dark) / flat.
+
+    Args:
+        dark, flat: ndarray
+            float32 master frames of the same size as analysed images.
+            The flat frame is normalised to mean value of 1.
+        eightBit: bool
+            Round and clip corrected regions back to 8-bit images. This
+            loses the sub-LSB part of the correction, so regions are kept
+            in float32 by default.
+    '''
+
+    def __init__(self, dark, flat, eightBit=False):
+        if dark.shape != flat.shape:
+            raise ValueError('Dark and flat frames have different sizes.')
+        self.dark = dark
+        self.flat = flat
+        self.eightBit = eightBit
+
+    @classmethod
+    def build(cls, darkPaths, flatPaths, directory, eightBit=False):
+        '''
+        Builds master frames from captures and saves them in directory.
+
+        Args:
+            darkPaths: list[str or Path]
+                Images taken with no light reaching the camera.
+            flatPaths: list[str or Path]
+                Images of uniformly illuminated field.
+            directory: str or Path
+                Where master frames are saved.
+            eightBit: bool
+                See Calibration.
+
+        Returns:
+            calibration: Calibration
+                Calibration using memory-mapped master frames.
+        '''
+        dark = _averageFrames(darkPaths)
+        flat = _averageFrames(flatPaths)
+        if flat.shape != dark.shape:
+            raise ValueError('Dark and flat frames have different sizes.')
+        flat -= dark
+        flat /= flat.mean()
+        # dead pixels would blow up the corrected signal, leave them as is
+        flat[flat <= 1e-3] = 1.
+
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, DARK_FILE), dark.astype(np.float32))
+        np.save(os.path.join(directory, FLAT_FILE), flat.astype(np.float32))
+        return cls.load(directory, eightBit)
+
+    @classmethod
+    def load(cls, directory, eightBit=False):
+        '''Memory-maps master frames previously saved by build.'''
+        return cls(
+            np.load(os.path.join(directory, DARK_FILE), mmap_mode='r'),
+            np.load(os.path.join(directory, FLAT_FILE), mmap_mode='r'),
+            eightBit
+        )
+
+    @staticmethod
+    def _cropMaster(master, box, fill):
+        left, upper, right, lower = box
+        ysize, xsize = master.shape
+        if left >= 0 and upper >= 0 and right <= xsize and lower <= ysize:
+            return master[upper:lower, left:right]
+        # box partially outside of the frame - pad like PIL crop does
+        cropped = np.full((lower - upper, right - left), fill, np.float32)
+        x0, y0 = max(left, 0), max(upper, 0)
+        x1, y1 = min(right, xsize), min(lower, ysize)
+        if x0 < x1 and y0 < y1:
+            cropped[y0 - upper:y1 - upper, x0 - left:x1 - left] = \
+                master[y0:y1, x0:x1]
+        return cropped
+
+    def correct(self, img, box):
+        '''
+        Crops image and corrects only the cropped region.
+
+        Args:
+            img: PIL.Image
+                B&W image of the same size as master frames.
+            box: tuple[int, int, int, int]
+                (left, upper, right, lower) region as used by PIL crop.
+
+        Returns:
+            cropped: ndarray or PIL.Image
+                Corrected float32 region, or 8-bit B&W image (rounded and
+                clipped) if eightBit is set.
+        '''
+        xsize, ysize = img.size
+        if (ysize, xsize) != self.dark.shape:
+            raise ValueError(
+                f'Image size {img.size} does not match calibration '
+                f'frames size {self.dark.shape[::-1]}.'
+            )
+        box = tuple(int(value) for value in box)
+        cropped = np.asarray(img.crop(box), dtype=np.float32)
+        # single float buffer reused by every step
+        np.subtract(cropped, self._cropMaster(self.dark, box, 0.), out=cropped)
+        np.divide(cropped, self._cropMaster(self.flat, box, 1.), out=cropped)
+        if not self.eightBit:
+            return cropped
+        np.rint(cropped, out=cropped)
+        np.clip(cropped, 0, 255, out=cropped)
+        return Image.fromarray(cropped.astype(np.uint8), 'L')
@@ -1,6 +1,8 @@
 import sys
 from functools import partial
 
+import numpy as np
+
 from PyQt6.QtWidgets import (
     QLabel,
     QMainWindow,
@@ -43,10 +45,14 @@ from PyQt6.QtCore import (
     QLine
 )
 
+from results import ResultsStore
+
 class App:
     def __init__(self, model, view):
         self._model = model
         self._view = view
+        self._lastResult = None
+        self._store = None
         self._connectSignalsAndSlots()
         self._chooseLoadAndCalculate()
 
@@ -103,11 +109,21 @@ class App:
             xstart=leftEdge, xend=rightEdge, ycenter=ycenter, yspan=yspan
         )
         signal, losses, res = results
+        signalX = self._model.signalX
+        variance = self._model.signalVariance
+        self._lastResult = dict(
+            path=filepath, signal=signal, losses=losses, res=res,
+            x=signalX, variance=variance, counts=self._model.signalCounts,
+            wgLength=wgLength, xleft=signalStartsAt, xright=signalEndsAt,
+            yspan=yspan, xstart=leftEdge, xend=rightEdge, ycenter=ycenter
+        )
 
         self._view.lossesPlot.drawPlots(
             self._model.img, xleft=signalStartsAt, xright=signalEndsAt,
             xstart=leftEdge, xend=rightEdge, wgLength=wgLength, ycenter=ycenter,
-            signal=signal, losses=losses, res=res, yspan=yspan, yspanFull=80
+            signal=signal, losses=losses, res=res, yspan=yspan, yspanFull=80,
+            xvals=signalX,
+            signalErr=None if variance is None else np.sqrt(variance)
         )
 
         sliders = [
@@ -117,6 +133,40 @@ class App:
         sliders[0].setX(leftEdge)
         sliders[1].setX(rightEdge)
 
+    def _saveData(self):
+        if self._store is None:
+            self._saveDataAs()
+            return
+        if self._lastResult is None:
+            self._view.workingIm.displayWarning(
+                'Calculate losses first (last result was already saved).',
+                'Nothing to save!'
+            )
+            return
+        try:
+            self._store.append(**self._lastResult)
+        except Exception as msg:
+            self._view.workingIm.displayWarning(msg, 'Data failed to save!')
+        else:
+            # every calculated result is stored only once
+            self._lastResult = None
+
+    def _saveDataAs(self):
+        directory = QFileDialog.getExistingDirectory(
+            self._view, 'Choose results store directory'
+        )
+        if not directory:
+            return
+        if self._store is not None:
+            # release the write lock, the same directory may be chosen
+            self._store.close()
+            self._store = None
+        try:
+            self._store = ResultsStore(directory)
+        except Exception as msg:
+            self._view.workingIm.displayWarning(msg, 'Store failed to open!')
+            return
+        self._saveData()
 
     def _connectSignalsAndSlots(self):
         self._view.controlsPanel.buttonsAndLabels['buttonLoadImage']\
@@ -125,6 +175,10 @@ class App:
             .clicked.connect(self._view.workingIm.rotateImage)
         self._view.controlsPanel.buttonsAndLabels['checkBoxInvertColors']\
             .stateChanged.connect(self._view.workingIm.invertColors)
+        self._view.controlsPanel.buttonsAndLabels['buttonSaveData']\
+            .clicked.connect(self._saveData)
+        self._view.controlsPanel.buttonsAndLabels['buttonSaveDataAs']\
+            .clicked.connect(self._saveDataAs)
 
 '''controls to connect'''
 # checkBoxAutoSelection = QCheckBox('Auto-selection'),
@@ -139,5 +193,3 @@ class App:
 # buttonSave = QPushButton('Save'),
 # buttonSaveAs = QPushButton('Save as...'),
 # labelData = QLabel('Raw data'),
-# buttonSaveData = QPushButton('Save data'),
-# buttonSaveDataAs = QPushButton('Save data as...')
\ No newline at end of file
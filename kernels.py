@@ -0,0 +1,160 @@
+'''
+Fused blur -> column mean -> log kernel used by Model.calculateLoss.
+
+Reproduces PIL GaussianBlur exactly: PIL approximates the gaussian with
+three passes of an extended box blur in fixed point arithmetic, rounding
+the result to 8 bits after every pass, first along rows and then along
+columns. The kernel does the same on the cropped region and writes
+column means straight into the signal array, without the intermediate
+PIL images.
+
+The 8-bit kernel needs Numba. Without it the regular PIL blur is used
+(with a warning), as a pure Python/NumPy version would be slower than
+PIL itself.
+
+Float regions (e.g. after calibration.Calibration) are blurred with the
+same box weights, but without rounding, so no precision is lost.
+'''
+import math
+import warnings
+
+import numpy as np
+from PIL import Image, ImageFilter
+from scipy.ndimage import correlate1d
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# ImageFilter.GaussianBlur defaults
+BLUR_RADIUS = 2
+BLUR_PASSES = 3
+
+
+def boxBlurParameters(radius=BLUR_RADIUS, passes=BLUR_PASSES):
+    '''
+    Returns (radius, ww, fw) of single box blur pass as computed by PIL.
+
+    PIL computes these values in single precision, so float32 is used
+    to get the same fixed point weights.
+    '''
+    f32 = np.float32
+    sigma2 = f32(radius) * f32(radius) / f32(passes)
+    # box length and its integer and fractional radius (Gwosdek et al.)
+    L = f32(math.sqrt(12. * float(sigma2) + 1.))
+    l = f32(math.floor((float(L) - 1.) / 2.))
+    a = (f32(2) * l + f32(1)) * (l * (l + f32(1)) - f32(3) * sigma2)
+    a /= f32(6) * (sigma2 - (l + f32(1)) * (l + f32(1)))
+    floatRadius = l + a
+
+    intRadius = int(floatRadius)
+    ww = int(f32(1 << 24) / (floatRadius * f32(2) + f32(1)))
+    fw = ((1 << 24) - (intRadius * 2 + 1) * ww) // 2
+    return intRadius, ww, fw
+
+
+def _blurMeanFloat(roi, out, radius, ww, fw, passes):
+    # weights of a single extended box blur pass, as in _boxBlurAxis0
+    weights = np.full(2 * radius + 3, ww / (1 << 24))
+    weights[0] = weights[-1] = fw / (1 << 24)
+    blurred = np.asarray(roi, dtype=np.float32)
+    for axis in (1, 0):
+        for _ in range(passes):
+            blurred = correlate1d(blurred, weights, axis=axis, mode='nearest')
+    blurred.mean(axis=0, dtype=np.float64, out=out)
+
+
+if numba is not None:
+    @numba.njit(nogil=True, cache=True)
+    def _boxBlurAxis0(src, dst, radius, ww, fw):
+        # whole rows are processed at once, so the inner loops run over
+        # contiguous memory
+        rows, cols = src.shape
+        last = rows - 1
+        acc = np.zeros(cols, np.int64)
+        for k in range(-radius - 1, radius):
+            row = src[min(max(k, 0), last)]
+            for x in range(cols):
+                acc[x] += row[x]
+        for y in range(rows):
+            add = src[min(y + radius, last)]
+            sub = src[max(y - radius - 1, 0)]
+            far = src[min(y + radius + 1, last)]
+            for x in range(cols):
+                acc[x] += np.int64(add[x]) - np.int64(sub[x])
+                bulk = acc[x] * ww \
+                    + fw * (np.int64(sub[x]) + np.int64(far[x]))
+                dst[y, x] = (bulk + (1 << 23)) >> 24
+
+    @numba.njit(nogil=True, cache=True)
+    def _blurMeanNumba(roi, out, radius, ww, fw, passes):
+        rows, cols = roi.shape
+        # horizontal passes on the transposed region
+        src = np.ascontiguousarray(roi.T)
+        dst = np.empty_like(src)
+        for _ in range(passes):
+            _boxBlurAxis0(src, dst, radius, ww, fw)
+            src, dst = dst, src
+        src = np.ascontiguousarray(src.T)
+        dst = np.empty_like(src)
+        for _ in range(passes):
+            _boxBlurAxis0(src, dst, radius, ww, fw)
+            src, dst = dst, src
+        out[:] = 0.
+        for y in range(rows):
+            for x in range(cols):
+                out[x] += src[y, x]
+        for x in range(cols):
+            out[x] /= rows
+else:
+    _blurMeanNumba = None
+
+
+def blurredLogSignal(roi, out=None, useNumba=True):
+    '''
+    Calculates np.log of column means of Gaussian blurred region.
+
+    Equivalent to
+        np.log(np.array(Image.fromarray(roi).filter(
+            ImageFilter.GaussianBlur)).mean(axis=0))
+
+    Args:
+        roi: ndarray
+            2D uint8 array of the cropped waveguide region, or float
+            array which is blurred without rounding.
+        out: ndarray
+            Preallocated float64 array of size roi.shape[1] receiving
+            the signal. Allocated if None.
+        useNumba: bool
+            Use Numba kernel for 8-bit regions. If False or Numba is not
+            installed, PIL blur is used instead.
+
+    Returns:
+        signal: ndarray
+    '''
+    isFloat = np.issubdtype(np.asarray(roi).dtype, np.floating)
+    roi = np.ascontiguousarray(roi, dtype=np.float32 if isFloat else np.uint8)
+    if out is None:
+        out = np.empty(roi.shape[1], np.float64)
+    elif out.shape != (roi.shape[1],) or out.dtype != np.float64:
+        raise ValueError('out has to be float64 array of roi width size.')
+    if roi.size == 0:
+        out[:] = np.nan
+        return out
+
+    radius, ww, fw = boxBlurParameters()
+    if isFloat:
+        _blurMeanFloat(roi, out, radius, ww, fw, BLUR_PASSES)
+    elif useNumba and _blurMeanNumba is not None:
+        _blurMeanNumba(roi, out, radius, ww, fw, BLUR_PASSES)
+    else:
+        if useNumba:
+            warnings.warn(
+                'Numba is not installed, PIL blur is used instead of '
+                'the fused kernel.', RuntimeWarning, stacklevel=2
+            )
+        blurred = Image.fromarray(roi).filter(ImageFilter.GaussianBlur)
+        np.asarray(blurred).mean(axis=0, out=out)
+    # NumPy log, so both kernels give the same values as the PIL path
+    return np.log(out, out=out)
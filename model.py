@@ -1,9 +1,22 @@
+import math
+import os
+import warnings
+
 from PIL import Image, ImageFilter, ImageOps
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 from scipy.stats import linregress
 
+from binning import binSignal, weightedLinregress
+from kernels import blurredLogSignal
+from projections import columnSum, rowSum
+from roidecode import decodeBand, openReduced
+from sharedframes import SharedFrame
+
+# coefficient required to obtain proper value of propagation loss
+# see: https://doi.org/10.1364/OE.460318 (end part of section 2)
+LOSS_COEFF = 4.343
 
 
 class Model:
@@ -11,12 +24,83 @@ class Model:
     # - rethink and simplify class methods
 
     def __init__(self):
-        # coefficient required to obtain proper value of propagation loss
-        # see: https://doi.org/10.1364/OE.460318 (end part of section 2)
-        self.LOSS_COEFF = 4.343
+        self.LOSS_COEFF = LOSS_COEFF
         self.img = None
+        # optional calibration.Calibration applied to the analysed region
+        self.calibration = None
+        # threads used for image projections (None - all CPUs)
+        self.projectionThreads = None
+        # use kernels.blurredLogSignal instead of PIL blur and NumPy mean
+        self.fusedKernel = False
+        # if set, signal is averaged into this many bins before the fit
+        self.signalBins = None
+        # positions [cm], variances and numbers of points (binned signal
+        # only) of the last calculated signal
+        self.signalX = None
+        self.signalVariance = None
+        self.signalCounts = None
+        # decode only rows needed for loss calculations, see roidecode
+        # (results are the same as with the full image)
+        self.roiDecoding = False
+        # locate waveguide on reduced resolution JPEG images and decode
+        # only rows around it - faster, but sample edges are found only
+        # up to the reduction factor, so losses can differ (with warning)
+        self.reducedLocation = False
+        # (img, array) pair when img is a view of an existing array
+        self._imgArray = None
+        # acquired sharedframes.SharedFrame img is a view of
+        self._frame = None
+        # signal array reused by the fused kernel for regions of the same
+        # width, never returned (see calculateLoss)
+        self._signalBuffer = None
 
     def loadImage(self, filepath):
+        '''
+        Loads image from path, PIL image, 2D uint8 array or
+        sharedframes.SharedFrame. Arrays and frames are used without
+        copying, a reference to the frame is held until another image
+        is loaded or unloadImage is called.
+        '''
+        frame = None
+        if isinstance(filepath, SharedFrame):
+            frame = filepath.acquire()
+        try:
+            self._loadImage(filepath if frame is None else frame.array())
+        except Exception:
+            if frame is not None:
+                frame.release()
+            raise
+        previous, self._frame = self._frame, frame
+        if previous is not None:
+            previous.release()
+
+    def unloadImage(self):
+        '''Drops loaded image and releases its shared memory frame.'''
+        self.img = None
+        self._imgArray = None
+        if self._frame is not None:
+            self._frame.release()
+            self._frame = None
+
+    def _loadImage(self, filepath):
+        # B&W frame array (e.g. in shared memory) - used without copying
+        if isinstance(filepath, np.ndarray):
+            if filepath.ndim != 2 or filepath.dtype != np.uint8:
+                raise ValueError('Only 2D uint8 arrays are supported.')
+            arr = np.ascontiguousarray(filepath)
+            ysize, xsize = arr.shape
+            self.img = Image.frombuffer(
+                'L', (xsize, ysize), arr, 'raw', 'L', 0, 1
+            )
+            self._imgArray = (self.img, arr)
+            return
+        # views of previous arrays are not kept alive
+        self._imgArray = None
+        # already decoded image (e.g. prefetched by pipeline.Pipeline)
+        if isinstance(filepath, Image.Image):
+            self.img = filepath if filepath.mode == 'L'\
+                else filepath.convert('L')
+            return
         with Image.open(filepath) as im:
             # convert to B&W
             self.img = im.convert('L')  # to black and white
@@ -25,20 +109,82 @@ class Model:
         if isinstance(self.img, Image.Image):
             # get image size in pixels
             xsize, ysize = self.img.size
-            proj = np.array(self.img).sum(axis=0)
+            if self._imgArray is not None and self._imgArray[0] is self.img:
+                arr = self._imgArray[1]
+            else:
+                arr = np.asarray(self.img)
+            proj = columnSum(arr, self.projectionThreads)
             xstart = proj[:xsize // 2].argmax()
             xend = proj[xsize // 2:].argmax() + xsize // 2
             sample_width_px = xend - xstart
             xleftpx = round(xstart + sample_width_px * xleft)
             xrightpx = round(xstart + sample_width_px * xright)
-            area = (xleftpx, 0, xrightpx, ysize)
 
-            cropped = np.array(self.img.crop(area))
-            ycenter = cropped.sum(axis=1).argmax()
+            # view instead of crop - zero padding of crop does not change
+            # row sums, so clipping to the image is enough
+            cropped = arr[:, max(xleftpx, 0):min(xrightpx, xsize)]
+            ycenter = rowSum(cropped, self.projectionThreads).argmax()
 
             return xstart, xend, ycenter
         raise FileNotFoundError('No image found.')
 
+    def loadImageRegion(self, filepath, xleft, xright, yspan,
+                        position=None):
+        '''
+        Loads only the part of the image needed to calculate losses.
+
+        If position is not known, the image is fully decoded to find it,
+        unless reducedLocation is set. Then the waveguide is located on
+        reduced resolution image (JPEG only) and only rows around it are
+        decoded at full resolution. Sample edges found this way can
+        differ from findWaveguidePosition by the reduction factor, so
+        a RuntimeWarning is issued. Rows outside of the decoded band of
+        self.img are black.
+
+        Args:
+            filepath: str or Path object
+            xleft, xright, yspan:
+                See calculateLoss.
+            position: tuple[int, int, int]
+                Known (xstart, xend, ycenter), if given only rows
+                ycenter +- yspan are decoded.
+
+        Returns:
+            xstart, xend, ycenter: int, int, int
+        '''
+        self.unloadImage()
+        if position is not None:
+            ycenter = position[2]
+            self.img = decodeBand(filepath, ycenter - yspan, ycenter + yspan)
+            return position
+
+        reduced = openReduced(filepath) if self.reducedLocation else None
+        if reduced is None:
+            self.loadImage(filepath)
+            return self.findWaveguidePosition(xleft, xright)
+
+        warnings.warn(
+            'Waveguide located on reduced resolution image, losses can '
+            'differ from the full resolution analysis.',
+            RuntimeWarning, stacklevel=2
+        )
+        self.img, xscale, yscale = reduced
+        xstart, xend, ycenter = self.findWaveguidePosition(xleft, xright)
+        xstart, xend = round(xstart * xscale), round(xend * xscale)
+        # refine ycenter using full resolution rows around the estimate
+        margin = math.ceil(yscale)
+        top = max(round(ycenter * yscale) - margin, 0)
+        bottom = round(ycenter * yscale) + margin + 1
+        self.img = decodeBand(filepath, top - yspan, bottom + yspan)
+        sample_width_px = xend - xstart
+        xleftpx = max(round(xstart + sample_width_px * xleft), 0)
+        xrightpx = min(
+            round(xstart + sample_width_px * xright), self.img.width
+        )
+        rows = np.asarray(self.img.crop((xleftpx, top, xrightpx, bottom)))
+        ycenter = top + rowSum(rows, self.projectionThreads).argmax()
+        return xstart, xend, ycenter
+
     def calculateLoss(
         self, filePath, wgLength, ycenter=None, xstart=None, xend=None,
         xleft=None, xright=None, yspan=10, autoselection=False
@@ -49,8 +195,9 @@ class Model:
         described by xleft and xright arguments.
 
         Args:
-            filePath: str or Path object
-                Path to desired image.
+            filePath: str, Path object, PIL.Image or ndarray
+                Path to desired image, already decoded image or 2D uint8
+                array of B&W frame.
             wgLength: int, float
                 Physical length of the waveguide (or waveguide part) visible
                 on the image
@@ -72,35 +219,79 @@ class Model:
                 whether ycenter, xstart and xend variables should be determined
                 automatically
 
+        With roiDecoding (or reducedLocation) set and filePath given as
+        path, only rows used in calculations are decoded if possible (see
+        loadImageRegion).
+
         Returns:
             signal, losses, res: list[ndarray, float, obj]
                 Calculated signal, propagation losses in dB/cm
-                and linear regression results.
+                and linear regression results. If signalBins is set and
+                the signal is wider, binned signal and results of the fit
+                weighted by the number of points in bins are returned.
+                Positions, variances and numbers of points of signal
+                points are available in signalX, signalVariance and
+                signalCounts.
         '''
-        # load image and convart to black and white
-        self.loadImage(filePath)
-
         # set defaul values of xleft and xright if at least one is not given
-        if not (xleft and xright):
+        if xleft is None or xright is None:
             xleft, xright = 0, 1
-        # find wg position automatically if autoselection is on
-        # or at least one of the parameters is available
-        if autoselection or not (xstart and xend and ycenter):
-            wgPosition = self.findWaveguidePosition(xleft, xright)
-            ycenter, xstart, xend = wgPosition
+        # 0 is a valid position (e.g. sample edge at the image border)
+        findPosition = autoselection or None in (xstart, xend, ycenter)
+
+        if (self.roiDecoding or self.reducedLocation) \
+                and isinstance(filePath, (str, os.PathLike)):
+            xstart, xend, ycenter = self.loadImageRegion(
+                filePath, xleft, xright, yspan,
+                None if findPosition else (xstart, xend, ycenter)
+            )
+        else:
+            # load image and convart to black and white
+            self.loadImage(filePath)
+            # find wg position automatically if autoselection is on
+            # or at least one of the parameters is available
+            if findPosition:
+                xstart, xend, ycenter = self.findWaveguidePosition(
+                    xleft, xright
+                )
 
         croppedWaveguideBox = (
             round(xstart + wgLength * xleft), ycenter - yspan,
             round(xend + wgLength * xright), ycenter + yspan
         )
 
-        wgImgCropped = self.img.crop(croppedWaveguideBox).filter(
-            ImageFilter.GaussianBlur
-        )
+        if self.calibration is not None:
+            wgImgCropped = self.calibration.correct(
+                self.img, croppedWaveguideBox
+            )
+        else:
+            wgImgCropped = self.img.crop(croppedWaveguideBox)
 
-        signal = np.log(np.array(wgImgCropped).mean(axis=0))
+        # float calibrated regions are blurred without rounding to 8 bits
+        if self.fusedKernel or isinstance(wgImgCropped, np.ndarray):
+            roi = np.asarray(wgImgCropped)
+            if self._signalBuffer is None \
+                    or self._signalBuffer.size != roi.shape[1]:
+                self._signalBuffer = np.empty(roi.shape[1], np.float64)
+            signal = blurredLogSignal(roi, out=self._signalBuffer)
+        else:
+            wgImgCropped = wgImgCropped.filter(ImageFilter.GaussianBlur)
+            signal = np.log(np.array(wgImgCropped).mean(axis=0))
         x = np.linspace(xleft * wgLength, xright * wgLength, signal.size)
-        res = linregress(x, signal)
+        if self.signalBins and signal.size > self.signalBins:
+            x, signal, variance, counts = binSignal(
+                x, signal, self.signalBins
+            )
+            # variances are only for error bars, see binning
+            res = weightedLinregress(x, signal, counts)
+        else:
+            if signal is self._signalBuffer:
+                # the buffer is overwritten by the next call
+                signal = signal.copy()
+            variance = counts = None
+            res = linregress(x, signal)
+        self.signalX, self.signalVariance = x, variance
+        self.signalCounts = counts
         losses = res.slope * self.LOSS_COEFF
 
         return signal, losses, res
@@ -0,0 +1,239 @@
+'''
+Pipelined batch runner overlapping image decoding and loss analysis.
+
+Images are decoded by a pool of reader threads and handed over to
+analysis threads through a bounded queue, so the disk is read ahead
+(up to `prefetch` images) while previous images are being analysed.
+PIL decoding and most of NumPy release the GIL, so both stages really
+run at the same time.
+'''
+import queue
+import threading
+import time
+
+from PIL import Image
+
+from model import Model
+
+# marks the end of the work in stage queues
+_DONE = object()
+
+
+class StageStats:
+    '''Time spent by the workers of a single pipeline stage.'''
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.  # doing actual work
+        self.starved = 0.  # waiting for input
+        self.blocked = 0.  # waiting for space in the output queue
+        self._lock = threading.Lock()
+
+    def add(self, busy=0., starved=0., blocked=0., items=0):
+        with self._lock:
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+            self.items += items
+
+    def utilisation(self, wallTime):
+        '''Fraction of available worker time spent on actual work.'''
+        if wallTime <= 0:
+            return 0.
+        return self.busy / (wallTime * self.workers)
+
+
+class PipelineStats:
+    def __init__(self, stages, wallTime):
+        self.stages = stages
+        self.wallTime = wallTime
+
+    @property
+    def bottleneck(self):
+        '''Name of the stage with the highest utilisation.'''
+        return max(
+            self.stages, key=lambda stage: stage.utilisation(self.wallTime)
+        ).name
+
+    def __str__(self):
+        lines = [f'wall time: {self.wallTime:.3f} s']
+        for stage in self.stages:
+            lines.append(
+                f'{stage.name:>8}: {stage.items} items, '
+                f'utilisation {stage.utilisation(self.wallTime):6.1%}, '
+                f'busy {stage.busy:.3f} s, starved {stage.starved:.3f} s, '
+                f'blocked {stage.blocked:.3f} s'
+            )
+        lines.append(f'bottleneck: {self.bottleneck}')
+        return '\n'.join(lines)
+
+
+class Pipeline:
+    '''
+    Calculates losses for many images with decoding running ahead of
+    the analysis.
+
+    Args:
+        readers: int
+            Number of threads reading and decoding images.
+        analysers: int
+            Number of threads running the loss analysis.
+        prefetch: int
+            Maximal number of decoded images waiting for analysis.
+        calibration: calibration.Calibration
+            Dark-frame and flat-field correction applied during analysis.
+        signalBins, fusedKernel, projectionThreads:
+            Set on the Model of every analysed image, see Model.
+    '''
+
+    def __init__(self, readers=1, analysers=1, prefetch=4, calibration=None,
+                 signalBins=None, fusedKernel=False, projectionThreads=None):
+        if min(readers, analysers, prefetch) < 1:
+            raise ValueError(
+                'readers, analysers and prefetch have to be positive.'
+            )
+        self.readers = readers
+        self.analysers = analysers
+        self.prefetch = prefetch
+        self.calibration = calibration
+        self.signalBins = signalBins
+        self.fusedKernel = fusedKernel
+        self.projectionThreads = projectionThreads
+        self.stats = None
+
+    @staticmethod
+    def decode(filePath):
+        with Image.open(filePath) as im:
+            # convert to B&W
+            return im.convert('L')
+
+    def analyse(self, img, wgLength, xleft=0, xright=1, yspan=10):
+        model = Model()
+        model.calibration = self.calibration
+        model.signalBins = self.signalBins
+        model.fusedKernel = self.fusedKernel
+        model.projectionThreads = self.projectionThreads
+        model.loadImage(img)
+        xstart, xend, ycenter = model.findWaveguidePosition(xleft, xright)
+        signal, losses, res = model.calculateLoss(
+            img, wgLength, xleft=xleft, xright=xright, xstart=xstart,
+            xend=xend, ycenter=ycenter, yspan=yspan
+        )
+        return dict(
+            position=(xstart, xend, ycenter),
+            signal=signal, losses=losses, res=res,
+            x=model.signalX, variance=model.signalVariance,
+            counts=model.signalCounts
+        )
+
+    def run(self, filePaths, wgLength, xleft=0, xright=1, yspan=10,
+            store=None):
+        '''
+        Calculates losses for all given images.
+
+        Args:
+            filePaths: list[str or Path]
+                Paths to images.
+            wgLength, xleft, xright, yspan:
+                See Model.calculateLoss.
+            store: results.ResultsStore
+                If given, every successfully analysed image is appended
+                to the store as soon as it is ready (in completion order).
+
+        Returns:
+            results: list[dict]
+                One dict per image, in order of filePaths, with "path",
+                "position" (xstart, xend, ycenter), "signal", "losses",
+                "res", "x", "variance", "counts" (see Model.signalX,
+                Model.signalVariance and Model.signalCounts) and "error"
+                (exception or None) keys. Timing of the stages is
+                available afterwards in `stats`.
+        '''
+        filePaths = list(filePaths)
+        results = [None] * len(filePaths)
+        readStats = StageStats('read', self.readers)
+        analyseStats = StageStats('analyse', self.analysers)
+
+        paths = queue.Queue()
+        for item in enumerate(filePaths):
+            paths.put(item)
+        for _ in range(self.readers):
+            paths.put(_DONE)
+        decoded = queue.Queue(maxsize=self.prefetch)
+        runningReaders = [self.readers]
+        readersLock = threading.Lock()
+
+        def reader():
+            while True:
+                item = paths.get()
+                if item is _DONE:
+                    break
+                index, path = item
+                t0 = time.perf_counter()
+                try:
+                    img, error = self.decode(path), None
+                except Exception as msg:
+                    img, error = None, msg
+                t1 = time.perf_counter()
+                decoded.put((index, img, error))
+                t2 = time.perf_counter()
+                readStats.add(busy=t1 - t0, blocked=t2 - t1, items=1)
+            with readersLock:
+                runningReaders[0] -= 1
+                if runningReaders[0] == 0:
+                    for _ in range(self.analysers):
+                        decoded.put(_DONE)
+
+        def analyser():
+            while True:
+                t0 = time.perf_counter()
+                item = decoded.get()
+                t1 = time.perf_counter()
+                if item is _DONE:
+                    analyseStats.add(starved=t1 - t0)
+                    break
+                index, img, error = item
+                result = dict(
+                    path=filePaths[index], position=None, signal=None,
+                    losses=None, res=None, x=None, variance=None,
+                    counts=None, error=error
+                )
+                if error is None:
+                    try:
+                        result.update(self.analyse(
+                            img, wgLength, xleft, xright, yspan
+                        ))
+                        if store is not None:
+                            xstart, xend, ycenter = result['position']
+                            store.append(
+                                result['path'], result['signal'],
+                                result['losses'], result['res'], wgLength,
+                                xleft, xright, yspan, xstart, xend, ycenter,
+                                result['x'], result['variance'],
+                                result['counts']
+                            )
+                    except Exception as msg:
+                        result['error'] = msg
+                results[index] = result
+                analyseStats.add(
+                    busy=time.perf_counter() - t1, starved=t1 - t0, items=1
+                )
+
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=reader, name=f'reader-{i}')
+            for i in range(self.readers)
+        ] + [
+            threading.Thread(target=analyser, name=f'analyser-{i}')
+            for i in range(self.analysers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stats = PipelineStats(
+            [readStats, analyseStats], time.perf_counter() - start
+        )
+        return results
@@ -0,0 +1,102 @@
+'''
+Multithreaded projections of large frames.
+
+Frames are split into strips of rows reduced in a thread pool (NumPy
+releases the GIL while summing) and the partial results are merged.
+Integer sums do not depend on the summation order, so results are
+identical to the plain `arr.sum(axis=...)`. Float sums do, so only
+integer (and bool) arrays are accepted.
+'''
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# strips smaller than this are not worth a separate task
+MIN_STRIP_ROWS = 64
+
+_executors = {}
+_executorsLock = threading.Lock()
+
+
+def _executor(threads):
+    with _executorsLock:
+        if threads not in _executors:
+            _executors[threads] = ThreadPoolExecutor(
+                max_workers=threads, thread_name_prefix='projection'
+            )
+        return _executors[threads]
+
+
+def _strips(rows, threads):
+    '''Returns (start, stop) row ranges, one per task.'''
+    if threads is None:
+        threads = os.cpu_count() or 1
+    count = max(1, min(threads, rows // MIN_STRIP_ROWS))
+    bounds = np.linspace(0, rows, count + 1).astype(int)
+    return list(zip(bounds[:-1], bounds[1:])), threads
+
+
+def _checkDtype(arr):
+    if arr.dtype.kind not in 'biu':
+        raise TypeError(
+            f'Only integer arrays can be projected, got {arr.dtype}.'
+        )
+
+
+def _sumDtype(arr):
+    # the same accumulator NumPy uses for arr.sum()
+    return np.add.reduce(np.zeros(1, dtype=arr.dtype)).dtype
+
+
+def columnSum(arr, threads=None):
+    '''
+    Sums 2D array along axis 0 (projection on the x axis).
+
+    Args:
+        arr: ndarray
+            2D integer image array.
+        threads: int
+            Number of threads used. If None all CPUs are used.
+    '''
+    _checkDtype(arr)
+    strips, threads = _strips(arr.shape[0], threads)
+    if len(strips) == 1:
+        return arr.sum(axis=0)
+    dtype = _sumDtype(arr)
+    partials = _executor(threads).map(
+        lambda strip: arr[strip[0]:strip[1]].sum(axis=0, dtype=dtype),
+        strips
+    )
+    proj = next(partials)
+    for partial in partials:
+        proj += partial
+    return proj
+
+
+def rowSum(arr, threads=None):
+    '''
+    Sums 2D array along axis 1 (projection on the y axis).
+
+    Args:
+        arr: ndarray
+            2D integer image array, possibly a view of a region of
+            a larger one.
+        threads: int
+            Number of threads used. If None all CPUs are used.
+    '''
+    _checkDtype(arr)
+    strips, threads = _strips(arr.shape[0], threads)
+    if len(strips) == 1:
+        return arr.sum(axis=1)
+    dtype = _sumDtype(arr)
+    proj = np.empty(arr.shape[0], dtype=dtype)
+
+    def reduceStrip(strip):
+        start, stop = strip
+        arr[start:stop].sum(axis=1, dtype=dtype, out=proj[start:stop])
+
+    # list() waits for all strips and re-raises errors of the workers
+    list(_executor(threads).map(reduceStrip, strips))
+    return proj
@@ -0,0 +1,355 @@
+'''
+Columnar, memory-mappable store of calculateLoss results.
+
+A store is a directory holding one raw binary file per column:
+
+    meta.json         - format version, number of rows and column dtypes
+    paths.txt         - image path of every row, one per line
+    <column>.bin      - fixed dtype per-image scalars (see COLUMNS)
+    signals.bin       - float64 signals of all rows, concatenated
+    offsets.bin       - int64 start of every signal within signals.bin
+    positions.bin     - float64 distance [cm] of every binned signal point
+    variances.bin     - float64 variance of every binned signal point
+    counts.bin        - int64 number of image columns in every bin
+    binOffsets.bin    - int64 start of every binned signal within the three
+                        files above, -1 for rows which are not binned
+
+Points of signals which are not binned are evenly spaced, so their
+positions are calculated from the row columns and not stored.
+
+Rows are appended at the end of the files and meta.json is rewritten
+afterwards, so a store interrupted in the middle of a batch still opens
+with all rows that were fully written. Only one ResultsStore (in any
+process) can have a directory opened for writing, which is enforced by
+an exclusive lock of write.lock. Any number of stores opened with
+readOnly can read it meanwhile; they never modify the files and see
+rows appended later after refresh. Columns are read as np.memmap,
+so stored signals can be plotted or fitted again without touching
+the images. Stores written in a different FORMAT_VERSION are rejected.
+'''
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+from scipy.stats import linregress
+
+from binning import weightedLinregress
+from model import LOSS_COEFF
+
+COLUMNS = dict(
+    wgLength='<f8',
+    xleft='<f8',
+    xright='<f8',
+    yspan='<i4',
+    xstart='<i4',
+    xend='<i4',
+    ycenter='<i4',
+    losses='<f8',
+    slope='<f8',
+    intercept='<f8',
+    rvalue='<f8',
+    pvalue='<f8',
+    stderr='<f8',
+    intercept_stderr='<f8',
+)
+SIGNAL_DTYPE = '<f8'
+# files holding one value per point of binned signals
+BINNED_FILES = {
+    'positions.bin': '<f8',
+    'variances.bin': '<f8',
+    'counts.bin': '<i8',
+}
+OFFSET_DTYPE = '<i8'
+# increased with every change of the files layout
+FORMAT_VERSION = 2
+
+
+def _lockExclusively(file):
+    '''Locks open file, raises OSError if it is locked by someone else.'''
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+class ResultsStore:
+    '''
+    Appendable store of per-image results and their signals.
+
+    Args:
+        directory: str or Path
+            Store location. Created if it does not exist (unless
+            readOnly is set).
+        readOnly: bool
+            Open existing store for reading only. Files are never
+            modified and the store can be read while another
+            ResultsStore appends to it.
+
+    Raises:
+        RuntimeError: if the store is opened for writing by another
+            ResultsStore.
+    '''
+
+    def __init__(self, directory, readOnly=False):
+        self.directory = os.fspath(directory)
+        self.readOnly = readOnly
+        self._lock = threading.Lock()
+        self._maps = {}
+        self._lockFile = None
+        if readOnly:
+            self._readMeta()
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._lockFile = open(self._file('write.lock'), 'a')
+        try:
+            _lockExclusively(self._lockFile)
+        except OSError:
+            self.close()
+            raise RuntimeError(
+                f'{self.directory} is already opened for writing.'
+            ) from None
+        if os.path.exists(self._file('meta.json')):
+            self._readMeta()
+        else:
+            self._rows = 0
+            self._signalSize = 0
+            self._binnedSize = 0
+            self._writeMeta()
+        self._truncate()
+
+    def _file(self, name):
+        return os.path.join(self.directory, name)
+
+    def _readMeta(self):
+        with open(self._file('meta.json')) as file:
+            meta = json.load(file)
+        version = meta.get('version', 1)
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f'{self.directory} was written in format version '
+                f'{version}, version {FORMAT_VERSION} is supported.'
+            )
+        if meta['columns'] != COLUMNS:
+            raise ValueError(
+                f'{self.directory} was written with different columns.'
+            )
+        self._rows = meta['rows']
+        self._signalSize = meta['signalSize']
+        self._binnedSize = meta['binnedSize']
+
+    def refresh(self):
+        '''Makes rows appended since opening visible to read-only store.'''
+        if self.readOnly:
+            with self._lock:
+                self._readMeta()
+                self._maps.clear()
+
+    def close(self):
+        '''Releases the write lock, the store can be opened by others.'''
+        if self._lockFile is not None:
+            self._lockFile.close()
+            self._lockFile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _truncate(self):
+        '''Drops data written after the last complete row.'''
+        for name, dtype in COLUMNS.items():
+            self._truncateFile(f'{name}.bin', self._rows, dtype)
+        self._truncateFile('offsets.bin', self._rows, OFFSET_DTYPE)
+        self._truncateFile('binOffsets.bin', self._rows, OFFSET_DTYPE)
+        self._truncateFile('signals.bin', self._signalSize, SIGNAL_DTYPE)
+        for name, dtype in BINNED_FILES.items():
+            self._truncateFile(name, self._binnedSize, dtype)
+        paths = self.paths() if self._rows else []
+        with open(self._file('paths.txt'), 'w', encoding='utf-8') as file:
+            file.writelines(f'{path}\n' for path in paths)
+
+    def _truncateFile(self, name, count, dtype):
+        with open(self._file(name), 'ab') as file:
+            file.truncate(count * np.dtype(dtype).itemsize)
+
+    def _writeMeta(self):
+        tmpPath = self._file('meta.json.tmp')
+        with open(tmpPath, 'w') as file:
+            json.dump(dict(
+                version=FORMAT_VERSION, rows=self._rows,
+                signalSize=self._signalSize, binnedSize=self._binnedSize,
+                columns=COLUMNS
+            ), file)
+        os.replace(tmpPath, self._file('meta.json'))
+
+    def append(self, path, signal, losses, res, wgLength, xleft, xright,
+               yspan, xstart, xend, ycenter, x=None, variance=None,
+               counts=None):
+        '''
+        Appends a single result of Model.calculateLoss.
+
+        Args:
+            path: str or Path
+                Path to the analysed image.
+            signal, losses, res:
+                Values returned by Model.calculateLoss.
+            wgLength, xleft, xright, yspan, xstart, xend, ycenter:
+                Arguments the losses were calculated with.
+            x, variance, counts: ndarray
+                Model.signalX, Model.signalVariance and Model.signalCounts.
+                Stored only for binned signals (variance is not None),
+                other signals are evenly spaced.
+        '''
+        if self._lockFile is None:
+            raise ValueError(f'{self.directory} is not opened for writing.')
+        values = dict(
+            wgLength=wgLength, xleft=xleft, xright=xright, yspan=yspan,
+            xstart=xstart, xend=xend, ycenter=ycenter, losses=losses,
+            slope=res.slope, intercept=res.intercept, rvalue=res.rvalue,
+            pvalue=res.pvalue, stderr=res.stderr,
+            intercept_stderr=res.intercept_stderr,
+        )
+        if '\n' in str(path):
+            raise ValueError('Path must not contain new line characters.')
+        signal = np.ascontiguousarray(signal, dtype=SIGNAL_DTYPE)
+        binned = variance is not None
+        if binned:
+            if x is None or counts is None:
+                raise ValueError(
+                    'x and counts are required for binned signals.'
+                )
+            points = [
+                np.ascontiguousarray(values, dtype=dtype)
+                for values, dtype in zip(
+                    (x, variance, counts), BINNED_FILES.values()
+                )
+            ]
+            if any(values.shape != signal.shape for values in points):
+                raise ValueError(
+                    'x, variance and counts have to match signal size.'
+                )
+        with self._lock:
+            for name, dtype in COLUMNS.items():
+                with open(self._file(f'{name}.bin'), 'ab') as file:
+                    file.write(np.array(values[name], dtype=dtype).tobytes())
+            with open(self._file('offsets.bin'), 'ab') as file:
+                file.write(
+                    np.array(self._signalSize, dtype=OFFSET_DTYPE).tobytes()
+                )
+            with open(self._file('binOffsets.bin'), 'ab') as file:
+                file.write(np.array(
+                    self._binnedSize if binned else -1, dtype=OFFSET_DTYPE
+                ).tobytes())
+            with open(self._file('signals.bin'), 'ab') as file:
+                file.write(signal.tobytes())
+            if binned:
+                for name, values in zip(BINNED_FILES, points):
+                    with open(self._file(name), 'ab') as file:
+                        file.write(values.tobytes())
+            with open(self._file('paths.txt'), 'a', encoding='utf-8') as file:
+                file.write(f'{path}\n')
+            self._rows += 1
+            self._signalSize += signal.size
+            if binned:
+                self._binnedSize += signal.size
+            self._writeMeta()
+            self._maps.clear()
+
+    def __len__(self):
+        return self._rows
+
+    def _map(self, name, dtype, count):
+        if name not in self._maps:
+            if count == 0:
+                self._maps[name] = np.empty(0, dtype=dtype)
+            else:
+                self._maps[name] = np.memmap(
+                    self._file(name), dtype=dtype, mode='r', shape=(count,)
+                )
+        return self._maps[name]
+
+    def column(self, name):
+        '''Returns read-only memory-mapped column of per-image scalars.'''
+        if name not in COLUMNS:
+            raise KeyError(f'Unknown column: {name}')
+        with self._lock:
+            return self._map(f'{name}.bin', COLUMNS[name], self._rows)
+
+    def paths(self):
+        with open(self._file('paths.txt'), encoding='utf-8') as file:
+            return [line.rstrip('\n') for line in file][:self._rows]
+
+    def signal(self, index):
+        '''Returns memory-mapped signal of the row with the given index.'''
+        with self._lock:
+            rows, size = self._rows, self._signalSize
+            offsets = self._map('offsets.bin', OFFSET_DTYPE, rows)
+            values = self._map('signals.bin', SIGNAL_DTYPE, size)
+        index = range(rows)[index]
+        end = offsets[index + 1] if index + 1 < rows else size
+        return values[offsets[index]:end]
+
+    def binned(self, index):
+        '''Returns whether the signal of the row was binned.'''
+        return self._binStart(index) >= 0
+
+    def _binStart(self, index):
+        with self._lock:
+            rows = self._rows
+            offsets = self._map('binOffsets.bin', OFFSET_DTYPE, rows)
+        return int(offsets[range(rows)[index]])
+
+    def _binnedPoints(self, name, index):
+        start = self._binStart(index)
+        if start < 0:
+            return None
+        size = self.signal(index).size
+        with self._lock:
+            values = self._map(name, BINNED_FILES[name], self._binnedSize)
+        return values[start:start + size]
+
+    def signals(self):
+        for index in range(len(self)):
+            yield self.signal(index)
+
+    def distance(self, index):
+        '''Returns distance values [cm] matching the stored signal.'''
+        positions = self._binnedPoints('positions.bin', index)
+        if positions is not None:
+            return positions
+        wgLength = self.column('wgLength')[index]
+        return np.linspace(
+            self.column('xleft')[index] * wgLength,
+            self.column('xright')[index] * wgLength,
+            self.signal(index).size
+        )
+
+    def variance(self, index):
+        '''Returns variances of the stored signal (None if not binned).'''
+        return self._binnedPoints('variances.bin', index)
+
+    def counts(self, index):
+        '''Returns numbers of points in bins (None if not binned).'''
+        return self._binnedPoints('counts.bin', index)
+
+    def refit(self, index):
+        '''Fits stored signal again, returns losses and regression results.'''
+        counts = self.counts(index)
+        if counts is None:
+            res = linregress(self.distance(index), self.signal(index))
+        else:
+            res = weightedLinregress(
+                self.distance(index), self.signal(index), counts
+            )
+        return res.slope * LOSS_COEFF, res
@@ -0,0 +1,143 @@
+'''
+Region-of-interest decoding of images.
+
+Loss calculations use only a narrow band of rows around the waveguide,
+so for large images most of the decoding work can be skipped:
+
+- JPEG images can be decoded at 1/2, 1/4 or 1/8 scale (draft mode),
+  which is enough to locate the waveguide,
+- decoding of sequential formats (PNG, JPEG) is stopped right after
+  the last needed row,
+- for uncompressed formats (BMP, TIFF) only the bytes of needed rows
+  are read,
+- for TIFF images stored in several strips or tiles only the strips
+  or tiles intersecting the band are decoded.
+
+Images in other formats are fully decoded.
+'''
+from PIL import Image
+
+# sequential decoders which can be stopped after the last needed row
+_SEQUENTIAL_CODECS = ('zip', 'jpeg')
+
+
+def openReduced(filePath, scale=8):
+    '''
+    Decodes image at reduced resolution if the format supports it.
+
+    Args:
+        filePath: str or Path
+        scale: int
+            Requested reduction factor (JPEG supports up to 8).
+
+    Returns:
+        img, xscale, yscale: PIL.Image, float, float
+            Reduced B&W image and factors to multiply its coordinates
+            by to get original image coordinates, or None if the image
+            cannot be decoded at reduced resolution.
+    '''
+    with Image.open(filePath) as im:
+        if im.format != 'JPEG':
+            return None
+        xsize, ysize = im.size
+        # draft picks the largest scale giving at least the requested size
+        im.draft('L', (max(xsize // scale, 1), max(ysize // scale, 1)))
+        img = im.convert('L')
+    return img, xsize / img.size[0], ysize / img.size[1]
+
+
+def _tileArgs(tile):
+    args = tile[3]
+    if isinstance(args, str):
+        args = (args,)
+    rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+    return rawmode, stride, orientation
+
+
+def _newTile(tile, extents, offset, args):
+    # tiles are plain (codec, extents, offset, args) tuples before
+    # Pillow 11 and namedtuples since then
+    if hasattr(tile, '_replace'):
+        return tile._replace(extents=extents, offset=offset, args=args)
+    return (tile[0], extents, offset, args)
+
+
+def _restrictTiles(im, top, bottom):
+    '''
+    Changes tiles of opened image so only rows top..bottom are decoded.
+    Returns False if it is not possible for this image.
+    '''
+    try:
+        return _restrictTileList(im, top, bottom)
+    except (AttributeError, TypeError, ValueError, IndexError):
+        # unexpected tile layout (e.g. other Pillow version), decode all
+        return False
+
+
+def _restrictTileList(im, top, bottom):
+    xsize, ysize = im.size
+    tiles = list(im.tile)
+    if not tiles or any(tile[0] == 'libtiff' for tile in tiles):
+        return False
+    if len(tiles) > 1:
+        # strips or tiles - keep only those intersecting the band
+        im.tile = [
+            tile for tile in tiles
+            if tile[1][1] < bottom and tile[1][3] > top
+        ]
+        return True
+
+    tile, = tiles
+    codec, extents, offset, args = tile
+    if tuple(extents) != (0, 0, xsize, ysize):
+        return False
+    if codec in _SEQUENTIAL_CODECS:
+        if im.info.get('interlace') or im.info.get('progressive'):
+            return False
+        im.tile = [_newTile(tile, (0, 0, xsize, bottom), offset, args)]
+        return True
+    if codec == 'raw':
+        rawmode, stride, orientation = _tileArgs(tile)
+        if not stride:
+            if rawmode != im.mode:
+                return False
+            stride = len(Image.new(im.mode, (xsize, 1)).tobytes())
+        # rows are stored bottom-up for negative orientation
+        firstRow = top if orientation > 0 else ysize - bottom
+        im.tile = [_newTile(
+            tile, (0, top, xsize, bottom), offset + firstRow * stride,
+            (rawmode, stride, orientation)
+        )]
+        return True
+    return False
+
+
+def decodeBand(filePath, top, bottom):
+    '''
+    Decodes rows top..bottom (exclusive) of the image.
+
+    Args:
+        filePath: str or Path
+        top, bottom: int
+            Band of rows to decode. Clipped to the image size.
+
+    Returns:
+        img: PIL.Image
+            Full size B&W image. Only rows of the band are guaranteed
+            to be decoded, other rows may be black.
+    '''
+    # opened from file object, so PIL does not memory-map the whole file
+    with open(filePath, 'rb') as fp, Image.open(fp) as im:
+        xsize, ysize = im.size
+        top, bottom = max(int(top), 0), min(int(bottom), ysize)
+        if top >= bottom or bottom == ysize and top == 0\
+                or not _restrictTiles(im, top, bottom):
+            return im.convert('L')
+        try:
+            im.load()
+        except OSError:
+            # JPEG decoder reports stopping before the end of the image
+            # as an error, rows decoded so far are fine
+            if im.format != 'JPEG' or bottom == ysize:
+                raise
+        return im.convert('L')
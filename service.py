@@ -0,0 +1,401 @@
+'''
+Local analysis service exposing Model.calculateLoss over HTTP.
+
+The service listens either on a TCP port (localhost by default) or on
+a Unix socket and accepts JSON POST requests on /losses:
+
+    {
+        "wgLength": 1.83,
+        "xleft": 0, "xright": 1, "yspan": 10,
+        "includeSignal": false,
+        "images": [
+            {"path": "examplary_pictures/SET_2_WG3.bmp"},
+            {"name": "upload.png", "data": "<base64 encoded file>"}
+        ]
+    }
+
+Every image of a request is analysed by a shared worker pool and the
+response contains one entry per image with the same fields as returned
+by calculateLoss (signal only when includeSignal is set). Values which
+are not finite (e.g. fits of black images) are sent as null, as JSON
+has no NaN or Infinity. Decoded images and waveguide positions are kept
+in memory between calls.
+'''
+import argparse
+import base64
+import hashlib
+import http.client
+import io
+import json
+import math
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+from model import Model
+
+
+def _jsonFloat(value):
+    '''Converts value to float, or None if it is NaN or infinite.'''
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+class ImageCache:
+    '''
+    Thread-safe LRU cache of decoded B&W images and waveguide positions.
+
+    Images are keyed by absolute path and modification time (files) or by
+    content hash (uploads), so a changed file is decoded again.
+    '''
+
+    def __init__(self, maxImages=32):
+        self.maxImages = maxImages
+        self._images = OrderedDict()
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, decode):
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return self._images[key]
+        # decode outside of the lock so other workers are not blocked
+        img = decode()
+        with self._lock:
+            self._images[key] = img
+            self._images.move_to_end(key)
+            while len(self._images) > self.maxImages:
+                oldKey, _ = self._images.popitem(last=False)
+                self._positions = {
+                    k: v for k, v in self._positions.items()
+                    if k[0] != oldKey
+                }
+        return img
+
+    def getPosition(self, key, xleft, xright, find):
+        with self._lock:
+            position = self._positions.get((key, xleft, xright))
+        if position is None:
+            position = find(xleft, xright)
+            with self._lock:
+                if key in self._images:
+                    self._positions[(key, xleft, xright)] = position
+        return position
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._positions.clear()
+
+
+class CachedModel(Model):
+    '''Model reading decoded images and projections from ImageCache.'''
+
+    def __init__(self, cache):
+        super().__init__()
+        self._cache = cache
+        self._key = None
+
+    @staticmethod
+    def _decode(source):
+        with Image.open(source) as im:
+            return im.convert('L')
+
+    def loadImage(self, filepath):
+        if isinstance(filepath, (bytes, bytearray)):
+            self._key = hashlib.sha1(filepath).hexdigest()
+            self.img = self._cache.get(
+                self._key, lambda: self._decode(io.BytesIO(filepath))
+            )
+        else:
+            path = os.path.abspath(filepath)
+            self._key = (path, os.stat(path).st_mtime_ns)
+            self.img = self._cache.get(self._key, lambda: self._decode(path))
+
+    def findWaveguidePosition(self, xleft, xright):
+        if self._key is None:
+            return super().findWaveguidePosition(xleft, xright)
+        return self._cache.getPosition(
+            self._key, xleft, xright, super().findWaveguidePosition
+        )
+
+
+class AnalysisService:
+    '''
+    Calculates losses for batches of images using a pool of workers.
+
+    Args:
+        workers: int
+            Number of images analysed concurrently.
+        maxImages: int
+            Number of decoded images kept in memory.
+    '''
+
+    def __init__(self, workers=4, maxImages=32):
+        self.cache = ImageCache(maxImages)
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='analysis'
+        )
+
+    def analyseImage(self, source, wgLength, xleft=0, xright=1, yspan=10,
+                     includeSignal=False):
+        '''
+        Calculates losses for a single image.
+
+        Args:
+            source: str, Path or bytes
+                Path to the image or content of an uploaded image file.
+            wgLength, xleft, xright, yspan:
+                See Model.calculateLoss.
+            includeSignal: bool
+                Whether the signal should be included in the result.
+
+        Returns:
+            result: dict
+                JSON serializable losses, regression results and
+                waveguide position. Values which are not finite are None.
+        '''
+        model = CachedModel(self.cache)
+        model.loadImage(source)
+        xstart, xend, ycenter = model.findWaveguidePosition(xleft, xright)
+        signal, losses, res = model.calculateLoss(
+            source, wgLength, xleft=xleft, xright=xright, xstart=xstart,
+            xend=xend, ycenter=ycenter, yspan=yspan
+        )
+        result = dict(
+            losses=_jsonFloat(losses),
+            slope=_jsonFloat(res.slope),
+            intercept=_jsonFloat(res.intercept),
+            rvalue=_jsonFloat(res.rvalue),
+            pvalue=_jsonFloat(res.pvalue),
+            stderr=_jsonFloat(res.stderr),
+            intercept_stderr=_jsonFloat(res.intercept_stderr),
+            xstart=int(xstart), xend=int(xend), ycenter=int(ycenter),
+        )
+        if includeSignal:
+            result['signal'] = [_jsonFloat(value) for value in signal]
+        return result
+
+    def analyseBatch(self, images, wgLength, xleft=0, xright=1, yspan=10,
+                     includeSignal=False):
+        '''
+        Calculates losses for a list of images in parallel.
+
+        Args:
+            images: list[str, Path or bytes]
+                Paths to images or contents of uploaded image files.
+
+        Returns:
+            results: list[dict]
+                Result of analyseImage for every image, in order. Failed
+                images are reported with an "error" field.
+        '''
+        futures = [
+            self._pool.submit(
+                self.analyseImage, source, wgLength, xleft, xright, yspan,
+                includeSignal
+            )
+            for source in images
+        ]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as msg:
+                results.append(dict(error=f'{type(msg).__name__}: {msg}'))
+        return results
+
+    def handleRequest(self, payload):
+        '''Runs analyseBatch for a decoded JSON request.'''
+        if 'wgLength' not in payload:
+            raise ValueError('wgLength is required.')
+        images = []
+        for entry in payload.get('images', []):
+            if 'data' in entry:
+                images.append(base64.b64decode(entry['data']))
+            elif 'path' in entry:
+                images.append(entry['path'])
+            else:
+                raise ValueError('Each image needs either "path" or "data".')
+        results = self.analyseBatch(
+            images, float(payload['wgLength']),
+            xleft=float(payload.get('xleft', 0)),
+            xright=float(payload.get('xright', 1)),
+            yspan=int(payload.get('yspan', 10)),
+            includeSignal=bool(payload.get('includeSignal', False)),
+        )
+        names = [
+            entry.get('name', entry.get('path'))
+            for entry in payload.get('images', [])
+        ]
+        for name, result in zip(names, results):
+            result['name'] = name
+        return dict(results=results)
+
+    def shutdown(self):
+        self._pool.shutdown()
+        self.cache.clear()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    def address_string(self):
+        # unix socket clients have no (host, port) address
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return 'unix'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _sendJson(self, status, content):
+        # NaN and Infinity are not valid JSON for other clients
+        body = json.dumps(content, allow_nan=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._sendJson(200, dict(status='ok'))
+        else:
+            self._sendJson(404, dict(error='Not found.'))
+
+    def do_POST(self):
+        if self.path != '/losses':
+            self._sendJson(404, dict(error='Not found.'))
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+            response = self.server.service.handleRequest(payload)
+        except (ValueError, TypeError, KeyError) as msg:
+            self._sendJson(400, dict(error=str(msg)))
+        else:
+            self._sendJson(200, response)
+
+
+class TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, quiet=False):
+        self.service = service
+        self.quiet = quiet
+        super().__init__(address, RequestHandler)
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service, quiet=False):
+        self.service = service
+        self.quiet = quiet
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def createServer(host='127.0.0.1', port=8765, socketPath=None, workers=4,
+                 maxImages=32, quiet=False):
+    '''
+    Creates (but does not start) analysis server.
+
+    If socketPath is given the server listens on a Unix socket, otherwise
+    on host:port. Use port=0 to let the system choose a free port.
+    '''
+    service = AnalysisService(workers=workers, maxImages=maxImages)
+    if socketPath:
+        return UnixServer(socketPath, service, quiet)
+    return TCPServer((host, port), service, quiet)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def requestLosses(images, wgLength, host='127.0.0.1', port=8765,
+                  socketPath=None, upload=False, timeout=None, **params):
+    '''
+    Client helper sending images to a running analysis service.
+
+    Args:
+        images: list[str or Path]
+            Paths to images.
+        upload: bool
+            Send image contents instead of paths (when the service runs
+            on a machine without access to the files).
+        params:
+            xleft, xright, yspan and includeSignal.
+
+    Returns:
+        results: list[dict]
+    '''
+    entries = []
+    for path in images:
+        if upload:
+            with open(path, 'rb') as file:
+                data = base64.b64encode(file.read()).decode()
+            entries.append(dict(name=os.path.basename(path), data=data))
+        else:
+            entries.append(dict(path=str(path)))
+    body = json.dumps(dict(images=entries, wgLength=wgLength, **params))
+
+    if socketPath:
+        connection = UnixHTTPConnection(socketPath, timeout=timeout)
+    else:
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request(
+            'POST', '/losses', body, {'Content-Type': 'application/json'}
+        )
+        response = connection.getresponse()
+        content = json.loads(response.read())
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise RuntimeError(content.get('error', response.reason))
+    return content['results']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', dest='socketPath', default=None,
+                        help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-images', dest='maxImages', type=int,
+                        default=32)
+    args = parser.parse_args()
+
+    server = createServer(**vars(args))
+    print(f'Serving on {args.socketPath or f"{args.host}:{server.server_port}"}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
@@ -0,0 +1,281 @@
+'''
+Shared-memory frames decoded by worker processes.
+
+Frames are allocated by the main (GUI) process in
+multiprocessing.shared_memory segments, worker processes decode images
+directly into them and only segment names travel between processes.
+The Model and the GUI image read the same memory without copying (the
+GUI copies it once more into the displayed pixmap):
+
+    pool = FramePool(workers=4)
+    with pool.load(path) as frame:
+        model.loadImage(frame)
+        view.loadFrame(frame)
+
+Frames are reference counted. FrameCache holds one reference to every
+cached frame and every consumer acquires its own, so a segment is
+released only after it left the cache and all consumers released it.
+Arrays and images returned by SharedFrame keep the segment mapped even
+after the last reference was released, it is unmapped only once they
+are gone too.
+'''
+import ctypes
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from PIL import Image
+
+# frames still exported (e.g. by numpy views) when they were released
+_unclosed = []
+_unclosedLock = threading.Lock()
+
+
+def _closeUnclosed():
+    with _unclosedLock:
+        for shm in _unclosed[:]:
+            try:
+                shm.close()
+            except BufferError:
+                continue
+            _unclosed.remove(shm)
+
+
+class SharedFrame:
+    '''
+    2D array stored in a shared memory segment.
+
+    Args:
+        shape: tuple[int, int]
+            (rows, columns) of the frame.
+        dtype: str or np.dtype
+        name: str
+            Name of an existing segment to attach to. New segment is
+            created if None.
+    '''
+
+    def __init__(self, shape, dtype=np.uint8, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self._size = size
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self._refs = 1
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def info(self):
+        '''Picklable description used to attach in another process.'''
+        return self.shape, self.dtype.str, self.name
+
+    @classmethod
+    def attach(cls, info):
+        shape, dtype, name = info
+        return cls(shape, dtype, name)
+
+    def array(self):
+        '''
+        Returns ndarray view of the segment. The view keeps the segment
+        mapped, so it stays valid even after the frame is released.
+        '''
+        # NumPy does not hold a buffer export of memoryviews, the ctypes
+        # array does (until the view is garbage collected), so closing
+        # the segment raises BufferError instead of unmapping the view
+        buffer = (ctypes.c_char * self._size).from_buffer(self._shm.buf)
+        return np.ndarray(self.shape, self.dtype, buffer=buffer)
+
+    def image(self):
+        '''Returns PIL image view of uint8 frame, see array.'''
+        ysize, xsize = self.shape
+        return Image.frombuffer(
+            'L', (xsize, ysize), self.array(), 'raw', 'L', 0, 1
+        )
+
+    def acquire(self):
+        with self._lock:
+            if self._refs == 0:
+                raise ValueError(f'Frame {self.name} was already released.')
+            self._refs += 1
+        return self
+
+    def release(self):
+        '''
+        Drops a reference, the last one closes (and, in the owner
+        process, unlinks) the segment. If views of the segment still
+        exist, it is closed by a later release after they are gone.
+        '''
+        with self._lock:
+            if self._refs == 0:
+                return
+            self._refs -= 1
+            if self._refs:
+                return
+        if self._owner:
+            self._shm.unlink()
+        try:
+            self._shm.close()
+        except BufferError:
+            # somebody still holds a view, close it later
+            with _unclosedLock:
+                _unclosed.append(self._shm)
+        _closeUnclosed()
+
+    @property
+    def released(self):
+        return self._refs == 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FrameCache:
+    '''
+    LRU cache of SharedFrame objects.
+
+    Args:
+        maxFrames: int
+            Number of frames kept. Least recently used frames are
+            dropped from the cache (and released once not used).
+    '''
+
+    def __init__(self, maxFrames=16):
+        self.maxFrames = maxFrames
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''Returns acquired frame (to be released by caller) or None.'''
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is None:
+                return None
+            self._frames.move_to_end(key)
+            return frame.acquire()
+
+    def put(self, key, frame):
+        '''Takes over the caller's reference to frame.'''
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            self._frames[key] = frame
+            evicted = []
+            while len(self._frames) > self.maxFrames:
+                evicted.append(self._frames.popitem(last=False)[1])
+        if previous is not None:
+            previous.release()
+        for old in evicted:
+            old.release()
+
+    def clear(self):
+        with self._lock:
+            frames = list(self._frames.values())
+            self._frames.clear()
+        for frame in frames:
+            frame.release()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key):
+        return key in self._frames
+
+
+def _decodeInto(filePath, info):
+    '''Worker process: decodes B&W image into an existing frame.'''
+    frame = SharedFrame.attach(info)
+    try:
+        with Image.open(filePath) as im:
+            img = im.convert('L')
+        if img.size[::-1] != frame.shape:
+            raise ValueError(f'{filePath} changed while being decoded.')
+        frame.array()[:] = np.asarray(img)
+    finally:
+        frame.release()
+
+
+class FramePool:
+    '''
+    Decodes images into shared memory frames in worker processes.
+
+    Args:
+        workers: int
+            Number of worker processes. If None, number of CPUs is used.
+        maxFrames: int
+            Number of decoded frames kept in FrameCache.
+    '''
+
+    def __init__(self, workers=None, maxFrames=16):
+        # workers have to share the tracker with this process, otherwise
+        # segments would be removed when the workers exit
+        resource_tracker.ensure_running()
+        self.cache = FrameCache(maxFrames)
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    def _submit(self, filePath):
+        # only the header is read here, to know the frame size
+        with Image.open(filePath) as im:
+            xsize, ysize = im.size
+        frame = SharedFrame((ysize, xsize), np.uint8)
+        try:
+            future = self._executor.submit(_decodeInto, filePath, frame.info)
+        except Exception:
+            frame.release()
+            raise
+        return frame, future
+
+    def _finish(self, filePath, frame, future):
+        try:
+            future.result()
+        except Exception:
+            frame.release()
+            raise
+        self.cache.put(filePath, frame)
+        return frame.acquire()
+
+    def load(self, filePath):
+        '''
+        Returns acquired frame of the image, decoding it if not cached.
+        The frame has to be released (or used as a context manager).
+        '''
+        frame = self.cache.get(filePath)
+        if frame is not None:
+            return frame
+        return self._finish(filePath, *self._submit(filePath))
+
+    def loadMany(self, filePaths):
+        '''Decodes images in parallel, yields acquired frames in order.'''
+        pending = []
+        try:
+            for filePath in filePaths:
+                frame = self.cache.get(filePath)
+                pending.append(
+                    (filePath, frame, None) if frame is not None
+                    else (filePath, *self._submit(filePath))
+                )
+            while pending:
+                filePath, frame, future = pending.pop(0)
+                yield frame if future is None \
+                    else self._finish(filePath, frame, future)
+        finally:
+            # frames not handed over because of an error or early exit
+            for _, frame, future in pending:
+                if future is not None:
+                    future.cancel()
+                frame.release()
+
+    def shutdown(self):
+        self._executor.shutdown()
+        self.cache.clear()
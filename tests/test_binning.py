@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from model import Model
+
+IMAGE = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'examplary_pictures', 'SET_2_WG3.bmp'
+)
+
+
+def losses(bins):
+    model = Model()
+    model.signalBins = bins
+    _, losses, _ = model.calculateLoss(
+        IMAGE, 0.5, xleft=.1, xright=.9, xstart=74, xend=1988, ycenter=743,
+        yspan=10
+    )
+    return losses
+
+
+@pytest.mark.parametrize('bins', [20, 50, 100, 200, 500])
+def test_binned_fit_matches_full_resolution(bins):
+    assert losses(bins) == pytest.approx(losses(None), rel=5e-3)
+
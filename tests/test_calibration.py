@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from calibration import Calibration
+from kernels import blurredLogSignal
+from model import Model
+
+IMAGE = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'examplary_pictures', 'SET_2_WG3.bmp'
+)
+ARGS = dict(xleft=.1, xright=.9, xstart=74, xend=1988, ycenter=743, yspan=10)
+
+
+def calculate(calibration):
+    model = Model()
+    model.calibration = calibration
+    signal, losses, _ = model.calculateLoss(IMAGE, 1, **ARGS)
+    return signal, losses
+
+
+@pytest.fixture(scope='module')
+def identity():
+    with Image.open(IMAGE) as im:
+        xsize, ysize = im.size
+    return (
+        np.zeros((ysize, xsize), np.float32),
+        np.ones((ysize, xsize), np.float32)
+    )
+
+
+def test_identity_reproduces_uncorrected_signal(identity):
+    signal, losses = calculate(None)
+    floatSignal, floatLosses = calculate(Calibration(*identity))
+    # float regions are not rounded to 8 bits after the blur
+    with Image.open(IMAGE) as im:
+        # box used by calculateLoss for ARGS and wgLength of 1
+        region = np.asarray(
+            im.convert('L').crop((74, 733, 1989, 753)), np.float32
+        )
+    np.testing.assert_allclose(
+        floatSignal, blurredLogSignal(region), rtol=1e-6
+    )
+    assert floatLosses == pytest.approx(losses, rel=1e-2)
+    eightBitSignal, _ = calculate(Calibration(*identity, eightBit=True))
+    np.testing.assert_array_equal(eightBitSignal, signal)
+
+
+@pytest.mark.parametrize('box', [
+    (-3, -2, 5, 4), (6, 5, 14, 12), (-1, -1, 11, 9), (2, 3, 6, 5),
+])
+def test_box_outside_of_frame_is_padded_like_crop(box):
+    rng = np.random.default_rng(0)
+    dark = rng.uniform(0, 10, (8, 10)).astype(np.float32)
+    flat = rng.uniform(.5, 1.5, (8, 10)).astype(np.float32)
+    img = Image.fromarray(rng.integers(20, 256, (8, 10), dtype=np.uint8))
+
+    corrected = Calibration(dark, flat).correct(img, box)
+
+    left, upper, right, lower = box
+    expected = np.zeros((lower - upper, right - left), np.float32)
+    for row in range(upper, lower):
+        for column in range(left, right):
+            if 0 <= row < 8 and 0 <= column < 10:
+                expected[row - upper, column - left] = (
+                    img.getpixel((column, row)) - dark[row, column]
+                ) / flat[row, column]
+    np.testing.assert_allclose(corrected, expected, rtol=1e-6)
+
+
+def test_build_rejects_frames_of_different_sizes(tmp_path):
+    paths = []
+    for name, size in (('dark.png', (10, 8)), ('flat.png', (12, 8))):
+        paths.append(str(tmp_path / name))
+        Image.new('L', size, 100).save(paths[-1])
+    with pytest.raises(ValueError, match='different sizes'):
+        Calibration.build(paths[:1], paths[1:], tmp_path / 'master')
+
+
+def test_build_normalises_flat(tmp_path):
+    rng = np.random.default_rng(1)
+    dark = str(tmp_path / 'dark.png')
+    flat = str(tmp_path / 'flat.png')
+    Image.new('L', (10, 8), 5).save(dark)
+    Image.fromarray(rng.integers(50, 200, (8, 10), dtype=np.uint8)).save(flat)
+    calibration = Calibration.build([dark], [flat], tmp_path / 'master')
+    assert np.all(calibration.dark == 5)
+    assert calibration.flat.mean() == pytest.approx(1, rel=1e-6)
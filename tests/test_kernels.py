@@ -0,0 +1,82 @@
+import warnings
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+
+import kernels
+from model import Model
+
+
+def pilSignal(roi):
+    blurred = Image.fromarray(roi).filter(ImageFilter.GaussianBlur)
+    with np.errstate(divide='ignore'):
+        return np.log(np.array(blurred).mean(axis=0))
+
+
+SHAPES = [
+    (1, 1), (1, 50), (50, 1), (2, 3), (3, 2), (4, 4), (5, 7),
+    (40, 333), (41, 2000),
+]
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_numba_kernel_matches_pil(shape):
+    pytest.importorskip('numba')
+    roi = np.random.default_rng(sum(shape)).integers(
+        0, 256, shape, dtype=np.uint8
+    )
+    with np.errstate(divide='ignore'):
+        signal = kernels.blurredLogSignal(roi)
+    np.testing.assert_array_equal(signal, pilSignal(roi))
+
+
+@pytest.mark.parametrize('value', [0, 255])
+def test_numba_kernel_matches_pil_on_constant_regions(value):
+    pytest.importorskip('numba')
+    roi = np.full((40, 50), value, np.uint8)
+    with np.errstate(divide='ignore'):
+        signal = kernels.blurredLogSignal(roi)
+    np.testing.assert_array_equal(signal, pilSignal(roi))
+
+
+def test_without_numba_pil_blur_is_used():
+    roi = np.random.default_rng(0).integers(0, 256, (20, 30), np.uint8)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        signal = kernels.blurredLogSignal(roi, useNumba=False)
+    np.testing.assert_array_equal(signal, pilSignal(roi))
+
+
+def test_float_region_is_not_rounded():
+    roi = np.full((10, 20), 100.25, np.float32)
+    signal = kernels.blurredLogSignal(roi)
+    np.testing.assert_allclose(np.exp(signal), 100.25, rtol=1e-6)
+
+
+def test_missing_numba_warns_and_falls_back_to_pil(monkeypatch):
+    monkeypatch.setattr(kernels, '_blurMeanNumba', None)
+    roi = np.random.default_rng(1).integers(0, 256, (20, 30), np.uint8)
+    with pytest.warns(RuntimeWarning, match='Numba'):
+        signal = kernels.blurredLogSignal(roi)
+    np.testing.assert_array_equal(signal, pilSignal(roi))
+
+
+def test_model_reuses_signal_buffer():
+    pytest.importorskip('numba')
+    img = Image.fromarray(np.random.default_rng(2).integers(
+        1, 256, (60, 200), dtype=np.uint8
+    ))
+    model = Model()
+    model.fusedKernel = True
+    first, _, _ = model.calculateLoss(img, 1, xstart=0, xend=150, ycenter=30)
+    buffer = model._signalBuffer
+    expected = first.copy()
+    second, _, _ = model.calculateLoss(
+        img.transpose(Image.Transpose.FLIP_LEFT_RIGHT), 1,
+        xstart=0, xend=150, ycenter=30
+    )
+    assert model._signalBuffer is buffer
+    assert first is not buffer and second is not buffer
+    np.testing.assert_array_equal(first, expected)
+    assert not np.array_equal(first, second)
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from model import Model
+from pipeline import Pipeline
+from results import ResultsStore
+
+PICTURES = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'examplary_pictures'
+)
+IMAGES = [
+    os.path.join(PICTURES, f'SET_2_WG{number}.bmp') for number in (3, 4, 5)
+]
+
+
+def expectedLosses(path):
+    _, losses, _ = Model().calculateLoss(path, 1, autoselection=True)
+    return losses
+
+
+def test_results_in_input_order_with_error_rows(tmp_path):
+    paths = IMAGES + [str(tmp_path / 'missing.bmp')] + IMAGES[::-1]
+    pipeline = Pipeline(readers=2, analysers=3, prefetch=2)
+    results = pipeline.run(paths, 1)
+
+    assert [result['path'] for result in results] == paths
+    *good, missing = results[:4]
+    assert isinstance(missing['error'], OSError)
+    assert missing['losses'] is None
+    for result in good + results[4:]:
+        assert result['error'] is None
+        assert result['losses'] == pytest.approx(
+            expectedLosses(result['path'])
+        )
+
+
+def test_successful_results_are_stored(tmp_path):
+    store = ResultsStore(tmp_path / 'store')
+    paths = IMAGES + [str(tmp_path / 'missing.bmp')]
+    results = Pipeline(analysers=2).run(paths, 1, store=store)
+
+    assert len(store) == len(IMAGES)
+    stored = dict(zip(store.paths(), store.column('losses')))
+    for result in results[:len(IMAGES)]:
+        assert stored[result['path']] == pytest.approx(result['losses'])
+
+
+def test_stats_count_every_image():
+    pipeline = Pipeline(readers=2, analysers=2)
+    pipeline.run(IMAGES, 1)
+    read, analyse = pipeline.stats.stages
+    assert read.items == analyse.items == len(IMAGES)
+    assert pipeline.stats.bottleneck in ('read', 'analyse')
+    assert 0 < analyse.utilisation(pipeline.stats.wallTime) <= 1
+    assert 'bottleneck' in str(pipeline.stats)
+
+
+def test_model_options_are_forwarded():
+    plain, = Pipeline().run(IMAGES[:1], 1)
+    tuned, = Pipeline(
+        fusedKernel=True, projectionThreads=2, signalBins=50
+    ).run(IMAGES[:1], 1)
+    assert tuned['error'] is None
+    assert tuned['signal'].size == 50 and tuned['counts'].sum() > 50
+    assert tuned['position'] == plain['position']
+    assert tuned['losses'] == pytest.approx(plain['losses'], rel=5e-3)
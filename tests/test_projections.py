@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from projections import columnSum, rowSum
+
+THREADS = [None, 1, 2, 3, 8]
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return np.random.default_rng(0).integers(
+        0, 256, (1500, 1700), dtype=np.uint8
+    )
+
+
+def assertIdentical(actual, expected):
+    assert actual.dtype == expected.dtype
+    np.testing.assert_array_equal(actual, expected)
+
+
+@pytest.mark.parametrize('threads', THREADS)
+@pytest.mark.parametrize('dtype', [np.uint8, np.uint16, np.int32, bool])
+def test_column_sum_matches_numpy(frame, threads, dtype):
+    arr = frame.astype(dtype)
+    assertIdentical(columnSum(arr, threads), arr.sum(axis=0))
+
+
+@pytest.mark.parametrize('threads', THREADS)
+def test_row_sum_of_region_matches_numpy(frame, threads):
+    region = frame[:, 300:1250]
+    assertIdentical(rowSum(region, threads), region.sum(axis=1))
+
+
+@pytest.mark.parametrize('threads', THREADS)
+@pytest.mark.parametrize('view', [
+    np.s_[::2, ::3], np.s_[::-1, 100:], np.s_[10:20, :], np.s_[:1, :],
+])
+def test_views(frame, threads, view):
+    arr = frame[view]
+    assertIdentical(columnSum(arr, threads), arr.sum(axis=0))
+    assertIdentical(rowSum(arr, threads), arr.sum(axis=1))
+    transposed = frame.T[view]
+    assertIdentical(columnSum(transposed, threads), transposed.sum(axis=0))
+
+
+def test_float_arrays_are_rejected():
+    with pytest.raises(TypeError):
+        columnSum(np.ones((200, 10)))
+    with pytest.raises(TypeError):
+        rowSum(np.ones((200, 10), np.float32))
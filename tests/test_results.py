@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+
+from model import Model
+from results import ResultsStore
+
+IMAGE = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'examplary_pictures', 'SET_2_WG3.bmp'
+)
+ARGS = dict(
+    wgLength=0.5, xleft=.1, xright=.9, xstart=74, xend=1988, ycenter=743,
+    yspan=10
+)
+
+
+def appendResult(store, bins):
+    model = Model()
+    model.signalBins = bins
+    signal, losses, res = model.calculateLoss(IMAGE, **ARGS)
+    store.append(
+        IMAGE, signal, losses, res, x=model.signalX,
+        variance=model.signalVariance, counts=model.signalCounts, **ARGS
+    )
+    return model, losses
+
+
+def test_points_stored_for_binned_rows_only(tmp_path):
+    store = ResultsStore(tmp_path)
+    full, fullLosses = appendResult(store, None)
+    binned, binnedLosses = appendResult(store, 100)
+    store.close()
+    store = ResultsStore(tmp_path)
+
+    assert not store.binned(0) and store.binned(1)
+    assert store.variance(0) is None and store.counts(0) is None
+    assert os.path.getsize(tmp_path / 'positions.bin') == 100 * 8
+    assert store.distance(0) == pytest.approx(full.signalX)
+    assert store.distance(1) == pytest.approx(binned.signalX)
+    assert store.variance(1) == pytest.approx(binned.signalVariance)
+    assert list(store.counts(1)) == list(binned.signalCounts)
+    assert store.refit(0)[0] == pytest.approx(fullLosses)
+    assert store.refit(1)[0] == pytest.approx(binnedLosses)
+
+
+def test_other_format_version_is_rejected(tmp_path):
+    ResultsStore(tmp_path).close()
+    metaPath = tmp_path / 'meta.json'
+    meta = json.loads(metaPath.read_text())
+    del meta['version']
+    metaPath.write_text(json.dumps(meta))
+    with pytest.raises(ValueError, match='format version 1'):
+        ResultsStore(tmp_path)
+
+
+def test_single_writer(tmp_path):
+    store = ResultsStore(tmp_path)
+    with pytest.raises(RuntimeError, match='already opened for writing'):
+        ResultsStore(tmp_path)
+    store.close()
+    with ResultsStore(tmp_path) as store:
+        appendResult(store, None)
+
+
+def test_read_only_store_reads_while_writing(tmp_path):
+    writer = ResultsStore(tmp_path)
+    appendResult(writer, None)
+    reader = ResultsStore(tmp_path, readOnly=True)
+    # bytes of an unfinished row must not be touched by readers
+    with open(tmp_path / 'signals.bin', 'ab') as file:
+        file.write(b'partial')
+    sizes = {name: os.path.getsize(tmp_path / name)
+             for name in os.listdir(tmp_path)}
+    paths = (tmp_path / 'paths.txt').read_bytes()
+
+    assert len(reader) == 1 and reader.paths() == [IMAGE]
+    assert reader.refit(0)[0] == pytest.approx(reader.column('losses')[0])
+    with pytest.raises(ValueError):
+        appendResult(reader, None)
+    assert sizes == {name: os.path.getsize(tmp_path / name)
+                     for name in os.listdir(tmp_path)}
+    assert (tmp_path / 'paths.txt').read_bytes() == paths
+
+    writer.close()
+    writer = ResultsStore(tmp_path)
+    appendResult(writer, 50)
+    assert len(reader) == 1
+    reader.refresh()
+    assert len(reader) == 2 and reader.binned(1)
+    assert reader.signal(1).size == 50
+    writer.close()
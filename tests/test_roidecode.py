@@ -0,0 +1,130 @@
+import os
+import warnings
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import roidecode
+from model import Model
+
+PICTURES = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'examplary_pictures'
+)
+FORMATS = {
+    'bmp': dict(),
+    'png': dict(),
+    'jpg': dict(quality=90),
+    'progressive.jpg': dict(quality=90, progressive=True),
+    'tif': dict(),
+    'lzw.tif': dict(compression='tiff_lzw'),
+}
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[:300, :400]
+    arr = 100 + 80 * np.sin(x / 17) * np.cos(y / 23) \
+        + rng.normal(0, 10, x.shape)
+    return Image.fromarray(arr.clip(0, 255).astype(np.uint8))
+
+
+@pytest.fixture(scope='module', params=list(FORMATS))
+def imagePath(request, frame, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('images') / f'image.{request.param}')
+    save = frame.convert('RGB') if request.param == 'bmp' else frame
+    save.save(path, **FORMATS[request.param])
+    return path
+
+
+def fullDecode(path):
+    with Image.open(path) as im:
+        return np.asarray(im.convert('L'))
+
+
+@pytest.mark.parametrize('top, bottom', [
+    (0, 1), (0, 40), (123, 167), (250, 300), (299, 300), (-10, 20),
+    (280, 400), (0, 300),
+])
+def test_band_matches_full_decode(imagePath, top, bottom):
+    band = np.asarray(roidecode.decodeBand(imagePath, top, bottom))
+    full = fullDecode(imagePath)
+    assert band.shape == full.shape
+    top, bottom = max(top, 0), min(bottom, full.shape[0])
+    np.testing.assert_array_equal(band[top:bottom], full[top:bottom])
+
+
+def test_plain_tuple_tiles_of_older_pillow(imagePath, monkeypatch):
+    restrict = roidecode._restrictTileList
+
+    def withPlainTuples(im, top, bottom):
+        im.tile = [tuple(tile) for tile in im.tile]
+        return restrict(im, top, bottom)
+
+    monkeypatch.setattr(roidecode, '_restrictTileList', withPlainTuples)
+    band = np.asarray(roidecode.decodeBand(imagePath, 100, 140))
+    np.testing.assert_array_equal(band[100:140], fullDecode(imagePath)[100:140])
+
+
+def test_unexpected_tiles_fall_back_to_full_decode(imagePath, monkeypatch):
+    def broken(im, top, bottom):
+        raise TypeError('unexpected tile')
+
+    monkeypatch.setattr(roidecode, '_restrictTileList', broken)
+    band = np.asarray(roidecode.decodeBand(imagePath, 100, 140))
+    np.testing.assert_array_equal(band, fullDecode(imagePath))
+
+
+def test_reduced_resolution_only_for_jpeg(imagePath):
+    reduced = roidecode.openReduced(imagePath)
+    if not imagePath.endswith('.jpg'):
+        assert reduced is None
+        return
+    img, xscale, yscale = reduced
+    assert img.size == (50, 38)
+    assert xscale == pytest.approx(8) and yscale == pytest.approx(8, rel=.05)
+
+
+@pytest.fixture(scope='module')
+def jpegPath(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('jpeg') / 'SET_2_WG3.jpg')
+    with Image.open(os.path.join(PICTURES, 'SET_2_WG3.bmp')) as im:
+        im.convert('L').save(path, quality=95)
+    return path
+
+
+def calculate(path, **options):
+    model = Model()
+    for name, value in options.items():
+        setattr(model, name, value)
+    signal, losses, _ = model.calculateLoss(
+        path, 1, xleft=.1, xright=.9, autoselection=True
+    )
+    return signal, losses
+
+
+def test_roi_decoding_does_not_change_results(jpegPath):
+    signal, losses = calculate(jpegPath)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        roiSignal, roiLosses = calculate(jpegPath, roiDecoding=True)
+    np.testing.assert_array_equal(roiSignal, signal)
+    assert roiLosses == losses
+
+    model = Model()
+    model.loadImage(jpegPath)
+    xstart, xend, ycenter = model.findWaveguidePosition(.1, .9)
+    model.roiDecoding = True
+    bandSignal, _, _ = model.calculateLoss(
+        jpegPath, 1, xleft=.1, xright=.9, xstart=xstart, xend=xend,
+        ycenter=ycenter
+    )
+    np.testing.assert_array_equal(bandSignal, signal)
+
+
+def test_reduced_location_warns(jpegPath):
+    _, losses = calculate(jpegPath)
+    with pytest.warns(RuntimeWarning, match='reduced resolution'):
+        _, reducedLosses = calculate(jpegPath, reducedLocation=True)
+    assert reducedLosses == pytest.approx(losses, rel=.1)
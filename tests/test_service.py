@@ -0,0 +1,112 @@
+import base64
+import http.client
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from service import createServer, requestLosses
+
+IMAGES = [
+    os.path.join(
+        os.path.dirname(__file__), os.pardir, 'examplary_pictures',
+        f'SET_2_WG{number}.bmp'
+    )
+    for number in (3, 4, 5)
+]
+
+
+def startServer(**kwargs):
+    server = createServer(workers=2, quiet=True, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stopServer(server):
+    server.shutdown()
+    server.server_close()
+    server.service.shutdown()
+
+
+@pytest.fixture
+def tcpServer():
+    server = startServer(port=0)
+    yield server
+    stopServer(server)
+
+
+@pytest.fixture
+def unixServer(tmp_path):
+    server = startServer(socketPath=str(tmp_path / 'service.sock'))
+    yield server
+    stopServer(server)
+
+
+def post(server, payload):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+    try:
+        connection.request('POST', '/losses', json.dumps(payload))
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_batch_of_paths_and_uploads(tcpServer):
+    with open(IMAGES[0], 'rb') as file:
+        data = base64.b64encode(file.read()).decode()
+    status, content = post(tcpServer, dict(wgLength=1, images=[
+        dict(path=IMAGES[0]),
+        dict(name='upload.bmp', data=data),
+        dict(path='missing.bmp'),
+    ]))
+    assert status == 200
+    byPath, uploaded, missing = content['results']
+    assert uploaded['name'] == 'upload.bmp'
+    assert uploaded['losses'] == pytest.approx(byPath['losses'])
+    assert 'error' in missing and missing['name'] == 'missing.bmp'
+
+
+def test_entry_without_path_or_data_is_rejected(tcpServer):
+    status, content = post(tcpServer, dict(wgLength=1, images=[dict()]))
+    assert status == 400 and 'error' in content
+    with pytest.raises(RuntimeError):
+        requestLosses([], None, port=tcpServer.server_port)
+
+
+def test_concurrent_clients(tcpServer):
+    expected = requestLosses(IMAGES, 1, port=tcpServer.server_port)
+    with ThreadPoolExecutor(6) as executor:
+        responses = list(executor.map(
+            lambda path: requestLosses(
+                [path], 1, port=tcpServer.server_port, upload=True
+            ),
+            IMAGES * 2
+        ))
+    for (result,), reference in zip(responses, expected * 2):
+        assert result['losses'] == pytest.approx(reference['losses'])
+
+
+def test_unix_socket(unixServer):
+    results = requestLosses(
+        IMAGES[:1], 1, socketPath=unixServer.server_address,
+        includeSignal=True
+    )
+    assert len(results[0]['signal']) > 0
+    assert 'error' not in results[0]
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_non_finite_values_are_sent_as_null(tcpServer, tmp_path):
+    path = str(tmp_path / 'black.png')
+    Image.fromarray(np.zeros((100, 300), np.uint8)).save(path)
+    result, = requestLosses(
+        [path], 1, port=tcpServer.server_port, includeSignal=True
+    )
+    assert result['losses'] is None
+    assert set(result['signal']) == {None}
@@ -0,0 +1,127 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from model import Model
+from sharedframes import FrameCache, FramePool, SharedFrame
+
+ROOT = os.path.join(os.path.dirname(__file__), os.pardir)
+IMAGES = [
+    os.path.join(ROOT, 'examplary_pictures', f'SET_2_WG{number}.bmp')
+    for number in (3, 4, 5)
+]
+
+
+def test_reference_counting():
+    frame = SharedFrame((4, 5))
+    assert frame.acquire() is frame
+    frame.release()
+    assert not frame.released
+    frame.release()
+    assert frame.released
+    frame.release()
+    with pytest.raises(ValueError):
+        frame.acquire()
+
+
+def test_views_outlive_released_frame():
+    frame = SharedFrame((30, 40))
+    arr = frame.array()
+    arr[:] = 3
+    img = frame.image()
+    column = arr[:, 5]
+    frame.release()
+    del arr
+    assert column.sum() == 90
+    assert img.getpixel((1, 1)) == 3
+    np.testing.assert_array_equal(np.asarray(img), 3)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = FrameCache(maxFrames=2)
+    frames = [SharedFrame((2, 2)) for _ in range(3)]
+    cache.put('a', frames[0])
+    cache.put('b', frames[1])
+    held = cache.get('a')
+    cache.put('c', frames[2])
+    assert 'b' not in cache and len(cache) == 2
+    assert frames[1].released
+    cache.put('d', SharedFrame((2, 2)))
+    # evicted, but still held by a consumer
+    assert 'a' not in cache and not held.released
+    held.release()
+    assert held.released
+    cache.clear()
+    assert frames[2].released
+
+
+def test_model_holds_frame_until_next_image():
+    frame = SharedFrame((20, 30))
+    frame.array()[:] = 9
+    model = Model()
+    model.loadImage(frame)
+    frame.release()
+    assert not frame.released
+    assert model.img.getpixel((0, 0)) == 9
+    model.loadImage(Image.new('L', (3, 3)))
+    assert frame.released and model._imgArray is None
+    model.unloadImage()
+    assert model.img is None
+
+
+def test_pool_loads_and_evicts():
+    pool = FramePool(workers=2, maxFrames=1)
+    try:
+        frames = list(pool.loadMany(IMAGES[:2]))
+        for frame, path in zip(frames, IMAGES):
+            with Image.open(path) as im:
+                np.testing.assert_array_equal(
+                    frame.array(), np.asarray(im.convert('L'))
+                )
+        assert len(pool.cache) == 1
+        assert not frames[0].released
+        for frame in frames:
+            frame.release()
+        assert frames[0].released and not frames[1].released
+        with pool.load(IMAGES[1]) as frame:
+            assert frame is frames[1]
+    finally:
+        pool.shutdown()
+
+
+def test_model_survives_eviction_of_its_frame():
+    # a crash would kill the interpreter, so it runs in a subprocess
+    script = textwrap.dedent(f'''
+        import sys
+        sys.path.insert(0, {os.path.abspath(ROOT)!r})
+        from model import Model
+        from sharedframes import FramePool
+        if __name__ == '__main__':
+            pool = FramePool(workers=1, maxFrames=1)
+            first, second = Model(), Model()
+            with pool.load({IMAGES[0]!r}) as frame:
+                first.loadImage(frame.array())
+            with pool.load({IMAGES[1]!r}) as frame:
+                second.loadImage(frame)
+            with pool.load({IMAGES[2]!r}) as frame:
+                pass
+            print(first.findWaveguidePosition(0, 1))
+            print(second.findWaveguidePosition(0, 1))
+            pool.shutdown()
+    ''')
+    result = subprocess.run(
+        [sys.executable, '-c', script], capture_output=True, text=True,
+        timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    expected = []
+    for path in IMAGES[:2]:
+        model = Model()
+        model.loadImage(path)
+        expected.append(str(model.findWaveguidePosition(0, 1)))
+    assert result.stdout.split('\n')[:2] == expected